@@ -1,104 +1,1689 @@
 import os
 import json
+import re
+import contextlib
+import contextvars
+import importlib.util
+import logging
 import base64
+import hashlib
+import sqlite3
+import threading
+import time
+import mimetypes
+import html
+import pathlib
+import weakref
+from collections import OrderedDict, deque
 import requests
+from requests.adapters import HTTPAdapter
 import subprocess
 import tempfile
-from together import Together
-from PIL import Image
 import io
-import webbrowser
 from dotenv import load_dotenv
 import argparse
 import sys
-from flask import Flask, request, jsonify, send_from_directory
-from flask_cors import CORS
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import atexit
+import itertools
+import random
+import email.utils
+import shlex
+import uuid
 
 # Load environment variables
 load_dotenv()
 
-# Create Flask app
-app = Flask(__name__, static_folder='generated_images')
-CORS(app)  # Enable CORS for all routes
+# The Flask app is built on first use (see create_app), so CLI runs never import
+# Flask, flask_cors or werkzeug. Routes and request hooks are collected here and
+# registered when the app is created, and each view imports the Flask helpers it uses.
+_routes = []
+_request_hooks = []
+_app = None
+_app_lock = threading.Lock()
 
-def generate_image_prompts(concept, num_prompts=3, include_nelson=True):
+def route(rule, **options):
+    """Collect an API route, registered on the Flask app by create_app()"""
+    def register(view):
+        _routes.append((rule, options, view))
+        return view
+    return register
+
+def request_hook(kind):
+    """Collect a before_request, after_request or teardown_request hook for create_app()"""
+    def register(hook):
+        _request_hooks.append((kind, hook))
+        return hook
+    return register
+
+def create_app():
+    """
+    Create the Flask app with CORS, the request hooks and every API route
+    
+    Returns:
+        Flask: The API app
+    """
+    from flask import Flask
+    from flask_cors import CORS
+    
+    flask_app = Flask(__name__, static_folder='generated_images')
+    CORS(flask_app)  # Enable CORS for all routes
+    for kind, hook in _request_hooks:
+        getattr(flask_app, kind)(hook)
+    for rule, options, view in _routes:
+        flask_app.route(rule, **options)(view)
+    return flask_app
+
+def get_app():
+    """
+    Return the shared Flask app, creating it on first use
+    
+    Returns:
+        Flask: The API app
+    """
+    global _app
+    with _app_lock:
+        if _app is None:
+            _app = create_app()
+        return _app
+
+def __getattr__(name):
+    # Keeps `app.app` and gunicorn's `app:app` working without building the app at import time
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Maximum number of provider calls kept in flight at once per generation run
+MAX_CONCURRENCY = int(os.environ.get("IMAGE_MAX_CONCURRENCY", "4"))
+
+# Trace id of the request or CLI run being handled, attached to every log line
+trace_id_var = contextvars.ContextVar("trace_id", default="-")
+
+
+class TraceIdFilter(logging.Filter):
+    """Add the current trace id to log records as %(trace_id)s"""
+    
+    def filter(self, record):
+        record.trace_id = trace_id_var.get()
+        return True
+
+
+_log_handler = logging.StreamHandler()
+_log_handler.addFilter(TraceIdFilter())
+_log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [trace=%(trace_id)s] %(message)s"))
+logger = logging.getLogger("story")
+logger.addHandler(_log_handler)
+logger.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+logger.propagate = False
+
+
+class Metrics:
+    """
+    Thread-safe counters, gauges and histograms in the Prometheus text format
+    
+    Metrics are identified by name plus keyword labels and created on first
+    use. render() produces the body served at /metrics.
+    """
+    
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+    
+    def __init__(self, buckets=None):
+        self.buckets = tuple(buckets or self.DEFAULT_BUCKETS)
+        self._types = {}
+        self._help = {}
+        self._values = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        
+    def describe(self, name, metric_type, help_text):
+        """Register the type ("counter", "gauge" or "histogram") and help text of a metric"""
+        self._types[name] = metric_type
+        self._help[name] = help_text
+        
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+    
+    def inc(self, name, value=1, **labels):
+        """Add value to a counter or gauge"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+            
+    def observe(self, name, value, **labels):
+        """Record one histogram sample"""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+            
+    @contextlib.contextmanager
+    def in_flight(self, name, **labels):
+        """Count the enclosed block in a gauge while it runs"""
+        self.inc(name, 1, **labels)
+        try:
+            yield
+        finally:
+            self.inc(name, -1, **labels)
+            
+    @staticmethod
+    def _format_labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        escaped = [(key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for key, value in pairs]
+        return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+    
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        with self._lock:
+            values = dict(self._values)
+            histograms = {key: {"buckets": list(h["buckets"]), "sum": h["sum"], "count": h["count"]}
+                          for key, h in self._histograms.items()}
+            
+        by_name = {}
+        for (name, labels), value in values.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for (name, labels), histogram in histograms.items():
+            by_name.setdefault(name, []).append((labels, histogram))
+            
+        lines = []
+        for name in sorted(by_name):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {self._types.get(name, 'untyped')}")
+            for labels, value in sorted(by_name[name], key=lambda item: item[0]):
+                if isinstance(value, dict):
+                    for bound, count in zip(self.buckets, value["buckets"]):
+                        lines.append(f"{name}_bucket{self._format_labels(labels, [('le', str(bound))])} {count}")
+                    lines.append(f"{name}_bucket{self._format_labels(labels, [('le', '+Inf')])} {value['count']}")
+                    lines.append(f"{name}_sum{self._format_labels(labels)} {value['sum']}")
+                    lines.append(f"{name}_count{self._format_labels(labels)} {value['count']}")
+                else:
+                    lines.append(f"{name}{self._format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared metrics registry served at /metrics
+metrics = Metrics()
+metrics.describe("story_stage_duration_seconds", "histogram", "Duration of pipeline stages")
+metrics.describe("story_stage_in_flight", "gauge", "Pipeline stages currently running")
+metrics.describe("story_provider_errors_total", "counter", "Failed calls to Nillion, Together, Ablo and the Story uploader")
+metrics.describe("story_provider_retries_total", "counter", "Provider calls retried after a failure")
+metrics.describe("story_circuit_opened_total", "counter", "Times a provider's circuit breaker opened")
+metrics.describe("story_prompt_cache_total", "counter", "Prompt expansion cache lookups by result")
+metrics.describe("story_image_result_cache_total", "counter", "Seeded image result cache lookups by result")
+metrics.describe("story_router_requests_total", "counter", "Auto-routed generations by the provider that served them")
+metrics.describe("story_router_hedges_total", "counter", "Hedge requests sent to a second provider")
+metrics.describe("story_singleflight_shared_total", "counter", "Calls that joined an identical in-flight call")
+metrics.describe("story_http_requests_total", "counter", "HTTP requests handled by endpoint and status")
+metrics.describe("story_http_request_duration_seconds", "histogram", "Time to produce an HTTP response")
+metrics.describe("story_http_requests_in_flight", "gauge", "HTTP requests currently being handled")
+
+
+@contextlib.contextmanager
+def timed_stage(stage, **labels):
+    """
+    Time one pipeline stage
+    
+    Tracks the stage in story_stage_in_flight while it runs, then records its
+    duration and outcome in story_stage_duration_seconds and logs the span
+    with the current trace id.
+    
+    Args:
+        stage (str): Stage name, e.g. "prompt_expansion" or "provider_generate"
+        **labels: Extra metric labels, e.g. provider="together"
+    """
+    outcome = "ok"
+    started = time.perf_counter()
+    try:
+        with metrics.in_flight("story_stage_in_flight", stage=stage, **labels):
+            yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        metrics.observe("story_stage_duration_seconds", duration, stage=stage, outcome=outcome, **labels)
+        details = "".join(f" {key}={value}" for key, value in sorted(labels.items()))
+        logger.info("stage=%s%s outcome=%s duration_ms=%.1f", stage, details, outcome, duration * 1000)
+
+
+class ClientRegistry:
+    """
+    Process-wide pooled HTTP sessions and provider SDK clients
+    
+    Sessions are created once per provider and reused by every request and
+    thread, so connections stay alive and the TLS handshake is paid once per
+    pooled connection instead of once per call. Each session keeps a separate
+    connection pool per host it talks to.
+    """
+    
+    def __init__(self, pool_connections=None, pool_maxsize=None):
+        self.pool_connections = pool_connections or int(os.environ.get("HTTP_POOL_CONNECTIONS", "10"))
+        self.pool_maxsize = pool_maxsize or int(os.environ.get("HTTP_POOL_MAXSIZE", str(max(MAX_CONCURRENCY, 10))))
+        self._sessions = {}
+        self._together_clients = {}
+        self._lock = threading.Lock()
+        
+    def session(self, name):
+        """
+        Get the shared requests session for a provider
+        
+        Args:
+            name (str): Provider name, e.g. "nillion" or "ablo". The pool size can
+                be overridden per provider with HTTP_POOL_MAXSIZE_<NAME>.
+                
+        Returns:
+            requests.Session: Keep-alive session with pooled connections
+        """
+        with self._lock:
+            session = self._sessions.get(name)
+            if session is None:
+                maxsize = int(os.environ.get(f"HTTP_POOL_MAXSIZE_{name.upper()}", str(self.pool_maxsize)))
+                adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=maxsize)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[name] = session
+            return session
+    
+    def together(self, api_key):
+        """
+        Get the shared Together client for an API key
+        
+        Args:
+            api_key (str): Together API key
+            
+        Returns:
+            Together: Client reused across requests
+        """
+        with self._lock:
+            client = self._together_clients.get(api_key)
+            if client is None:
+                from together import Together
+                
+                # Retries are handled by provider_guard("together"), not the SDK
+                client = Together(api_key=api_key, base_url=os.environ.get("TOGETHER_BASE_URL") or None,
+                                  max_retries=0, timeout=provider_timeout("together")[1])
+                self._together_clients[api_key] = client
+            return client
+
+
+# Shared client registry for Nillion, Ablo and Together
+clients = ClientRegistry()
+
+
+class ProviderUnavailableError(Exception):
+    """Raised without calling the provider when its circuit is open or its rate limit is saturated"""
+    
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter
+    
+    Holds up to capacity tokens and refills at rate tokens per second. Each
+    call takes one token, waiting for a refill when the bucket is empty.
+    """
+    
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        
+    def acquire(self, timeout=None):
+        """
+        Take one token
+        
+        Args:
+            timeout (float, optional): Longest time to wait for a token
+            
+        Returns:
+            bool: True once a token was taken, False if it would take longer than timeout
+        """
+        if self.rate <= 0:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait_seconds = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait_seconds > deadline:
+                return False
+            time.sleep(wait_seconds)
+
+
+class CircuitBreaker:
+    """
+    Fail fast while a provider is down
+    
+    After failure_threshold consecutive failures the circuit opens and calls
+    are refused for reset_timeout seconds. Then a single trial call is let
+    through: success closes the circuit, failure opens it again.
+    """
+    
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        
+    def allow(self):
+        """Return True if a call may go to the provider now"""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open":
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+            return True
+        
+    def retry_after(self):
+        """Seconds until the circuit lets a trial call through"""
+        with self._lock:
+            return max(self.reset_timeout - (time.monotonic() - self._opened_at), 0)
+        
+    def release(self):
+        """Give back a trial slot taken by allow() without calling the provider"""
+        with self._lock:
+            self._trial_in_flight = False
+            
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info("Circuit for %s closed", self.name)
+            self.state = "closed"
+            self._failures = 0
+            self._trial_in_flight = False
+            
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or (self.state == "closed" and self._failures >= self.failure_threshold):
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                metrics.inc("story_circuit_opened_total", provider=self.name)
+                logger.warning("Circuit for %s opened after %d failures", self.name, self._failures)
+
+
+# HTTP statuses worth retrying: timeouts, rate limits and server errors
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+def retry_info(error):
+    """
+    Decide whether a provider error is transient
+    
+    Understands requests errors and the Together SDK's errors, which carry
+    http_status and headers.
+    
+    Returns:
+        tuple: (retryable, Retry-After in seconds or None)
+    """
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True, None
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(error, "http_status", None) \
+        or getattr(error, "status_code", None)
+    if status is None:
+        name = type(error).__name__
+        return any(word in name for word in ("RateLimit", "Timeout", "Connection", "ServiceUnavailable")), None
+    
+    headers = getattr(response, "headers", None) or getattr(error, "headers", None) or {}
+    retry_after = headers.get("Retry-After") if hasattr(headers, "get") else None
+    if retry_after is not None:
+        try:
+            retry_after = float(retry_after)
+        except (TypeError, ValueError):
+            # HTTP-date form; a malformed header is treated as absent
+            try:
+                retry_at = email.utils.parsedate_to_datetime(retry_after)
+                retry_after = retry_at.timestamp() - time.time() if retry_at else None
+            except (TypeError, ValueError):
+                retry_after = None
+    return status in RETRYABLE_STATUSES, retry_after
+
+
+def provider_setting(name, key, default):
+    """Read <NAME>_<KEY> from the environment, falling back to PROVIDER_<KEY> and then default"""
+    return float(os.environ.get(f"{name.upper()}_{key}", os.environ.get(f"PROVIDER_{key}", default)))
+
+
+def provider_timeout(name):
+    """
+    Connect and read timeouts for a provider's HTTP calls
+    
+    Set with <NAME>_CONNECT_TIMEOUT and <NAME>_READ_TIMEOUT, falling back to
+    PROVIDER_CONNECT_TIMEOUT (default 10s) and PROVIDER_READ_TIMEOUT (default 120s).
+    
+    Returns:
+        tuple: (connect seconds, read seconds), as accepted by requests
+    """
+    return provider_setting(name, "CONNECT_TIMEOUT", "10"), provider_setting(name, "READ_TIMEOUT", "120")
+
+
+def post_json(session, url, **kwargs):
+    """POST with a pooled session, raise on HTTP errors and return the decoded JSON body"""
+    response = session.post(url, **kwargs)
+    response.raise_for_status()
+    return response.json()
+
+
+class ProviderGuard:
+    """
+    Rate limiting, retries and a circuit breaker around one provider's calls
+    
+    Each attempt waits for a token from the provider's bucket. Transient
+    failures (see retry_info) are retried with exponential backoff and full
+    jitter, or after the provider's Retry-After when it sends one. They also
+    count toward the circuit breaker. Other errors are raised immediately.
+    
+    Settings come from <NAME>_RATE_LIMIT (calls per second, 0 disables),
+    <NAME>_BURST, <NAME>_MAX_RETRIES, <NAME>_CIRCUIT_THRESHOLD and
+    <NAME>_CIRCUIT_RESET, falling back to the PROVIDER_* defaults.
+    """
+    
+    def __init__(self, name):
+        def setting(key, default):
+            return provider_setting(name, key, default)
+        
+        self.name = name
+        rate = setting("RATE_LIMIT", "10")
+        self.bucket = TokenBucket(rate, setting("BURST", str(max(rate, 1))))
+        self.max_retries = int(setting("MAX_RETRIES", "3"))
+        self.base_delay = setting("RETRY_BASE_DELAY", "0.5")
+        self.max_delay = setting("RETRY_MAX_DELAY", "30")
+        self.max_wait = setting("RATE_LIMIT_MAX_WAIT", "30")
+        self.breaker = CircuitBreaker(name, int(setting("CIRCUIT_THRESHOLD", "5")), setting("CIRCUIT_RESET", "30"))
+        
+    def call(self, func, *args, **kwargs):
+        """
+        Call func(*args, **kwargs) with rate limiting, retries and the circuit breaker
+        
+        Raises:
+            ProviderUnavailableError: If the circuit is open or no rate limit
+                token is available within the maximum wait
+            Exception: The provider's own error once retries are exhausted
+        """
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                raise ProviderUnavailableError(f"{self.name} is unavailable (circuit open)",
+                                               self.breaker.retry_after())
+            if not self.bucket.acquire(timeout=self.max_wait):
+                self.breaker.release()
+                raise ProviderUnavailableError(f"{self.name} rate limit exceeded", 1 / max(self.bucket.rate, 1e-9))
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                retryable, retry_after = retry_info(e)
+                if not retryable:
+                    # The provider answered; the request itself was bad
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt == self.max_retries or self.breaker.state == "open":
+                    raise
+                delay = retry_after if retry_after is not None else random.uniform(0, self.base_delay * 2 ** attempt)
+                delay = min(max(delay, 0), self.max_delay)
+                metrics.inc("story_provider_retries_total", provider=self.name)
+                logger.warning("%s call failed (%s), retry %d/%d in %.1fs",
+                               self.name, e, attempt + 1, self.max_retries, delay)
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+
+_provider_guards = {}
+_provider_guards_lock = threading.Lock()
+
+
+def provider_guard(name):
+    """Return the shared ProviderGuard for a provider, creating it on first use"""
+    with _provider_guards_lock:
+        guard = _provider_guards.get(name)
+        if guard is None:
+            guard = _provider_guards[name] = ProviderGuard(name)
+        return guard
+
+
+def iter_bounded(func, items, max_concurrency=1):
+    """
+    Apply func to every item with at most max_concurrency calls in flight
+    
+    Args:
+        func (callable): Function called with (index, item)
+        items (list): Items to process
+        max_concurrency (int): Maximum number of concurrent calls. 1 runs serially.
+        
+    Yields:
+        tuple: (index, result) as each call completes
+    """
+    items = list(items)
+    if max_concurrency is None or max_concurrency <= 1 or len(items) <= 1:
+        for i, item in enumerate(items):
+            yield i, func(i, item)
+        return
+    
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(items))) as executor:
+        # Run each call in a copy of the caller's context so the trace id follows it
+        futures = {executor.submit(contextvars.copy_context().run, func, i, item): i
+                   for i, item in enumerate(items)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def run_bounded(func, items, max_concurrency=1):
+    """
+    Apply func to every item with at most max_concurrency calls in flight
+    
+    Args:
+        func (callable): Function called with (index, item)
+        items (list): Items to process
+        max_concurrency (int): Maximum number of concurrent calls. 1 runs serially.
+        
+    Returns:
+        list: Results in the same order as items
+    """
+    items = list(items)
+    results = [None] * len(items)
+    for i, result in iter_bounded(func, items, max_concurrency):
+        results[i] = result
+    return results
+
+# Prompt expansion settings. Bump PROMPT_SYSTEM_VERSION whenever the system
+# messages below change so cached expansions from the old wording are ignored.
+PROMPT_MODEL = "meta-llama/Llama-3.1-8B-Instruct"
+PROMPT_TEMPERATURE = 0.7
+PROMPT_SYSTEM_VERSION = 1
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into a single execution
+    
+    The first caller for a key runs the function. Callers arriving while it is
+    still in flight wait for it and get the same result or exception. The key
+    is forgotten as soon as the call finishes, so nothing is cached beyond
+    the in-flight window.
+    """
+    
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+        self._lock = threading.Lock()
+        
+    def do(self, key, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs), or join the in-flight call with the same key
+        
+        Args:
+            key (hashable): Identity of the call, e.g. normalized prompt and parameters
+            func (callable): Function to run if no identical call is in flight
+            
+        Returns:
+            The function's result, shared between every caller with this key
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                
+        if not leader:
+            metrics.inc("story_singleflight_shared_total", kind=str(key[0]))
+            return future.result()
+        
+        try:
+            result = func(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                
+    def stream(self, key, func, *args, **kwargs):
+        """
+        Iterate func(*args, **kwargs), or join the in-flight iteration with the same key
+        
+        Every caller gets every item from the start. Whichever caller needs the
+        next item first advances the shared iterator, so a caller that stops
+        early does not stall the others. The iterator is closed once no caller
+        is left.
+        
+        Args:
+            key (hashable): Identity of the call, e.g. normalized prompt and parameters
+            func (callable): Function returning an iterator, e.g. a generator function
+            
+        Returns:
+            iterator: The items of the shared iteration
+        """
+        with self._lock:
+            flight = self._streams.get(key)
+            if flight is None:
+                flight = self._streams[key] = _StreamFlight(func(*args, **kwargs))
+            else:
+                metrics.inc("story_singleflight_shared_total", kind=str(key[0]))
+            flight.consumers += 1
+        return self._follow(key, flight)
+    
+    def _follow(self, key, flight):
+        position = 0
+        try:
+            while True:
+                finished = False
+                with flight.lock:
+                    if position == len(flight.items) and not flight.done:
+                        try:
+                            flight.items.append(next(flight.iterator))
+                        except StopIteration:
+                            flight.done = finished = True
+                        except Exception as e:
+                            flight.error = e
+                            flight.done = finished = True
+                    item = flight.items[position] if position < len(flight.items) else None
+                    end = position >= len(flight.items)
+                if finished:
+                    # Later callers start a fresh iteration instead of replaying this one
+                    with self._lock:
+                        if self._streams.get(key) is flight:
+                            del self._streams[key]
+                if end:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                position += 1
+                yield item
+        finally:
+            with self._lock:
+                flight.consumers -= 1
+                abandoned = flight.consumers == 0 and self._streams.get(key) is flight
+                if abandoned:
+                    del self._streams[key]
+            if abandoned and hasattr(flight.iterator, "close"):
+                with flight.lock:
+                    flight.iterator.close()
+
+
+class _StreamFlight:
+    """State of one shared iteration: the items produced so far and how it ended"""
+    
+    def __init__(self, iterator):
+        self.iterator = iterator
+        self.items = []
+        self.done = False
+        self.error = None
+        self.consumers = 0
+        self.lock = threading.Lock()
+
+
+# Shared in-flight registry for prompt expansions and image generations
+single_flight = SingleFlight()
+
+
+class PromptCache:
+    """
+    Disk-backed cache of prompt expansions with TTL and size eviction
+    
+    Entries live in a small SQLite database so they survive restarts and can be
+    shared by every worker on the machine.
+    """
+    
+    def __init__(self, path=None, ttl=None, max_entries=None):
+        self.path = path or os.environ.get("PROMPT_CACHE_PATH", os.path.join(".cache", "prompt_cache.sqlite"))
+        self.ttl = ttl if ttl is not None else int(os.environ.get("PROMPT_CACHE_TTL", str(7 * 24 * 3600)))
+        self.max_entries = max_entries if max_entries is not None else int(os.environ.get("PROMPT_CACHE_MAX_ENTRIES", "1000"))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._initialized = False
+        
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS prompt_cache ("
+                "key TEXT PRIMARY KEY, prompts TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_prompt_cache_last_access ON prompt_cache (last_access)")
+            self._initialized = True
+        return conn
+    
+    @staticmethod
+    def make_key(concept, num_prompts, include_nelson, model, temperature, system_version):
+        """Build the cache key for one prompt expansion request"""
+        raw = json.dumps([concept, num_prompts, include_nelson, model, temperature, system_version])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    def get(self, key):
+        """
+        Look up a cached expansion
+        
+        Args:
+            key (str): Key from make_key
+            
+        Returns:
+            list: Cached prompts, or None on a miss
+        """
+        now = time.time()
+        prompts = None
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                conn = self._connect()
+                with conn:
+                    row = conn.execute(
+                        "SELECT prompts, created_at FROM prompt_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row and now - row[1] <= self.ttl:
+                        conn.execute("UPDATE prompt_cache SET last_access = ? WHERE key = ?", (now, key))
+                        prompts = json.loads(row[0])
+                    elif row:
+                        conn.execute("DELETE FROM prompt_cache WHERE key = ?", (key,))
+                conn.close()
+        except Exception as e:
+            logger.warning("Error reading prompt cache: %s", e)
+            
+        with self._lock:
+            if prompts is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return prompts
+    
+    def put(self, key, prompts):
+        """
+        Store an expansion and evict expired or least recently used entries
+        
+        Args:
+            key (str): Key from make_key
+            prompts (list): Prompts to store
+        """
+        now = time.time()
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                conn = self._connect()
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO prompt_cache (key, prompts, created_at, last_access) VALUES (?, ?, ?, ?)",
+                        (key, json.dumps(prompts), now, now)
+                    )
+                    conn.execute("DELETE FROM prompt_cache WHERE created_at < ?", (now - self.ttl,))
+                    conn.execute(
+                        "DELETE FROM prompt_cache WHERE key IN ("
+                        "SELECT key FROM prompt_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,)
+                    )
+                conn.close()
+        except Exception as e:
+            logger.warning("Error writing prompt cache: %s", e)
+            
+    def stats(self):
+        """Return hit/miss counters"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+# Shared prompt cache. Set PROMPT_CACHE_DISABLED=1 to always call the LLM.
+prompt_cache = PromptCache()
+PROMPT_CACHE_ENABLED = os.environ.get("PROMPT_CACHE_DISABLED", "").lower() not in ("1", "true", "yes")
+
+
+def prompt_system_message(include_nelson=True):
+    """Return the system message that instructs the LLM to write image prompts"""
+    if include_nelson:
+        return """
+            You are a specialized image prompt generator. 
+            Create detailed, high-quality image prompts for the concept provided.
+            Each prompt should be different but related to the same concept. Max of 10 words.
+            Make the prompts specific, visual, and detailed enough for an image generation model.
+            Prompt MUST start with 'n3lson man', eg: 'n3lson man on beach' since 'n3lson' is the keyword for the image fine tuned model.
+            ONLY return the prompts, one per line, with no additional explanation or commentary.
+            """
+    return """
+            You are a specialized image prompt generator. 
+            Create detailed, high-quality image prompts for the concept provided.
+            Each prompt should be different but related to the same concept. Max of 10 words.
+            Make the prompts specific, visual, and detailed enough for an image generation model.
+            ONLY return the prompts, one per line, with no additional explanation or commentary.
+            """
+
+
+def normalize_prompt(prompt):
+    """Lowercase a prompt and collapse its whitespace, for request coalescing and dedupe"""
+    return " ".join(prompt.lower().split())
+
+
+def generate_image_prompts(concept, num_prompts=3, include_nelson=True, use_cache=True):
+    """
+    Use the Nillion API to generate detailed image prompts from a simple concept
+    
+    Concurrent calls for the same normalized concept and options share one
+    LLM call.
+    
+    Args:
+        concept (str): Simple concept like "on beach"
+        num_prompts (int): Number of different prompts to generate
+        include_nelson (bool): Whether to include n3lson in the prompts
+        use_cache (bool): Whether to reuse a cached expansion for the same request
+        
+    Returns:
+        list: List of generated detailed prompts
+    """
+    key = ("prompts", normalize_prompt(concept), num_prompts, include_nelson, use_cache)
+    return list(single_flight.do(key, _expand_image_prompts, concept, num_prompts, include_nelson, use_cache))
+
+
+def _expand_image_prompts(concept, num_prompts, include_nelson, use_cache):
+    use_cache = use_cache and PROMPT_CACHE_ENABLED
+    cache_key = PromptCache.make_key(concept, num_prompts, include_nelson,
+                                     PROMPT_MODEL, PROMPT_TEMPERATURE, PROMPT_SYSTEM_VERSION)
+    if use_cache:
+        cached_prompts = prompt_cache.get(cache_key)
+        if cached_prompts is not None:
+            metrics.inc("story_prompt_cache_total", result="hit")
+            print(f"Using {len(cached_prompts)} cached image prompts for '{concept}'")
+            return cached_prompts
+        metrics.inc("story_prompt_cache_total", result="miss")
+    
+    try:
+        # Get environment variables for Nillion API
+        api_url = os.environ.get("NILAI_API_URL", "https://nilai-a779.nillion.network")
+        api_key = os.environ.get("NILAI_API_KEY", "Nillion2025")
+        
+        # Prepare system message to instruct LLM to generate image prompts
+        system_message = prompt_system_message(include_nelson)
+        
+        # Prepare the request
+        url = f"{api_url}/v1/chat/completions"
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+        payload = {
+            "model": PROMPT_MODEL,
+            "messages": [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": f"Generate {num_prompts} different detailed image prompts for the concept: '{concept}'"}
+            ],
+            "temperature": PROMPT_TEMPERATURE,  # Slightly higher temperature for creativity
+        }
+        
+        # Make the API call
+        with timed_stage("prompt_expansion", provider="nillion"):
+            result = provider_guard("nillion").call(post_json, clients.session("nillion"), url,
+                                                    headers=headers, json=payload, timeout=provider_timeout("nillion"))
+        generated_text = result['choices'][0]['message']['content']
+        
+        # Split text into individual prompts (one per line)
+        prompts = [p.strip() for p in generated_text.strip().split('\n') if p.strip()]
+        
+        # Limit to requested number of prompts
+        prompts = prompts[:num_prompts]
+        
+        print(f"Generated {len(prompts)} image prompts:")
+        for i, prompt in enumerate(prompts):
+            print(f"{i+1}. {prompt}")
+        
+        # Only cache real expansions, never the fallback prompts below
+        if use_cache and prompts:
+            prompt_cache.put(cache_key, prompts)
+            
+        return prompts
+        
+    except Exception as error:
+        metrics.inc("story_provider_errors_total", provider="nillion")
+        logger.warning("Prompt expansion failed, using fallback prompts: %s", error)
+        # Fallback prompts if API call fails
+        if include_nelson:
+            return [f"n3lson {concept} realistic photo high definition" for _ in range(num_prompts)]
+        else:
+            return [f"{concept} realistic photo high definition" for _ in range(num_prompts)]
+
+
+
+def generate_image_prompts_batch(concepts, include_nelson=True, use_cache=True):
+    """
+    Expand several concepts into one detailed prompt each with a single LLM call
+    
+    Cached expansions are reused, and only the remaining concepts are sent to
+    the Nillion API together. If the response does not contain exactly one
+    prompt per concept, each concept falls back to generate_image_prompts.
+    
+    Args:
+        concepts (list): Simple concepts like "on beach"
+        include_nelson (bool): Whether to include n3lson in the prompts
+        use_cache (bool): Whether to reuse cached expansions
+        
+    Returns:
+        list: One detailed prompt per concept, in the same order
+    """
+    use_cache = use_cache and PROMPT_CACHE_ENABLED
+    prompts = [None] * len(concepts)
+    cache_keys = [PromptCache.make_key(concept, 1, include_nelson, PROMPT_MODEL,
+                                       PROMPT_TEMPERATURE, PROMPT_SYSTEM_VERSION) for concept in concepts]
+    if use_cache:
+        for i, cache_key in enumerate(cache_keys):
+            cached_prompts = prompt_cache.get(cache_key)
+            metrics.inc("story_prompt_cache_total", result="hit" if cached_prompts else "miss")
+            if cached_prompts:
+                prompts[i] = cached_prompts[0]
+                
+    missing = [i for i, prompt in enumerate(prompts) if prompt is None]
+    if len(missing) == 1:
+        prompts[missing[0]] = generate_image_prompts(concepts[missing[0]], 1, include_nelson, use_cache)[0]
+    elif missing:
+        try:
+            api_url = os.environ.get("NILAI_API_URL", "https://nilai-a779.nillion.network")
+            api_key = os.environ.get("NILAI_API_KEY", "Nillion2025")
+            concept_list = "\n".join(f"{n+1}. {concepts[i]}" for n, i in enumerate(missing))
+            payload = {
+                "model": PROMPT_MODEL,
+                "messages": [
+                    {"role": "system", "content": prompt_system_message(include_nelson)},
+                    {"role": "user", "content": f"Generate one detailed image prompt for each of these {len(missing)} "
+                                                f"concepts, one line per concept, in the same order:\n{concept_list}"}
+                ],
+                "temperature": PROMPT_TEMPERATURE,
+            }
+            headers = {
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {api_key}"
+            }
+            
+            with timed_stage("prompt_expansion", provider="nillion"):
+                result = provider_guard("nillion").call(post_json, clients.session("nillion"),
+                                                        f"{api_url}/v1/chat/completions", headers=headers, json=payload,
+                                                        timeout=provider_timeout("nillion"))
+                generated_text = result['choices'][0]['message']['content']
+                
+            # Drop any "1." style numbering the model echoes back
+            lines = [re.sub(r"^\s*\d+[.)]\s*", "", p).strip() for p in generated_text.strip().split('\n')]
+            lines = [line for line in lines if line]
+            if len(lines) != len(missing):
+                raise ValueError(f"expected {len(missing)} prompts, got {len(lines)}")
+            
+            logger.info("Generated %d image prompts in one batch", len(lines))
+            for i, prompt in zip(missing, lines):
+                prompts[i] = prompt
+                if use_cache:
+                    prompt_cache.put(cache_keys[i], [prompt])
+        except Exception as error:
+            logger.warning("Batch prompt expansion failed, expanding concepts one at a time: %s", error)
+            for i in missing:
+                prompts[i] = generate_image_prompts(concepts[i], 1, include_nelson, use_cache)[0]
+                
+    return prompts
+
+
+# File signatures of the formats providers return, used to skip re-encoding
+IMAGE_EXTENSIONS = {"png": "png", "jpeg": "jpg", "jpg": "jpg", "webp": "webp"}
+
+
+def detect_image_format(image_bytes):
+    """
+    Identify an image format from its header bytes
+    
+    Args:
+        image_bytes (bytes): Encoded image
+        
+    Returns:
+        str: "png", "jpeg" or "webp", or None if the header is not recognized
+    """
+    if image_bytes.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if image_bytes.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def format_from_filename(filename):
+    """Return the image format implied by a filename's extension, or None"""
+    extension = os.path.splitext(filename)[1].lower().lstrip(".")
+    if extension == "jpg":
+        return "jpeg"
+    return extension if extension in IMAGE_EXTENSIONS else None
+
+
+def encode_image_bytes(image_bytes, image_format=None):
+    """
+    Convert encoded image bytes to another format, only when one is requested
+    
+    Args:
+        image_bytes (bytes): Encoded image as returned by the provider
+        image_format (str, optional): Target format. Defaults to the source format.
+        
+    Returns:
+        tuple: (encoded bytes, format name)
+        
+    Raises:
+        ValueError: If the bytes are not a recognized image
+    """
+    source_format = detect_image_format(image_bytes)
+    if source_format is None:
+        raise ValueError("Image data has an unrecognized header")
+    
+    target_format = (image_format or source_format).lower()
+    if target_format == "jpg":
+        target_format = "jpeg"
+    if target_format == source_format:
+        return image_bytes, source_format
+    
+    from PIL import Image
+    
+    image = Image.open(io.BytesIO(image_bytes))
+    if target_format == "jpeg" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    output = io.BytesIO()
+    image.save(output, format=target_format.upper())
+    return output.getvalue(), target_format
+
+
+def write_image_bytes(image_bytes, filename, image_format=None):
+    """
+    Write encoded image bytes to disk, re-encoding only when a conversion is requested
+    
+    When the bytes are already in the target format they are written as-is, so
+    the image is never decoded. Otherwise the image is converted with PIL.
+    
+    Args:
+        image_bytes (bytes): Encoded image as returned by the provider
+        filename (str): Destination path
+        image_format (str, optional): Target format. Defaults to the format
+            implied by the filename extension.
+            
+    Raises:
+        ValueError: If the bytes are not a recognized image
+    """
+    image_bytes, _ = encode_image_bytes(image_bytes, image_format or format_from_filename(filename))
+    with open(filename, "wb") as f:
+        f.write(image_bytes)
+
+
+class ImageStore:
+    """
+    Content-addressed image store with a SQLite metadata catalog
+    
+    Images are named by the SHA-256 of their bytes and sharded into
+    root/ab/cd/<sha256>.<ext>, so identical images are stored once and names
+    never collide. Every generation that produced an image is recorded in the
+    catalog together with its prompt and provider parameters.
+    """
+    
+    def __init__(self, root=None, catalog_path=None):
+        self.root = root or os.environ.get("IMAGE_STORE_ROOT", "generated_images")
+        # The catalog holds every prompt, so it must stay outside the served image root
+        self.catalog_path = catalog_path or os.environ.get("IMAGE_CATALOG_PATH",
+                                                           os.path.join(".cache", "image_catalog.sqlite"))
+        self._lock = threading.Lock()
+        self._initialized = False
+        
+    def _connect(self):
+        if not self._initialized:
+            os.makedirs(self.root, exist_ok=True)
+            os.makedirs(os.path.dirname(self.catalog_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.catalog_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS images ("
+                    "sha256 TEXT PRIMARY KEY, name TEXT NOT NULL UNIQUE, path TEXT NOT NULL, "
+                    "format TEXT NOT NULL, size_bytes INTEGER NOT NULL, created_at REAL NOT NULL)"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS generations ("
+                    "id INTEGER PRIMARY KEY AUTOINCREMENT, sha256 TEXT NOT NULL REFERENCES images(sha256), "
+                    "prompt TEXT, provider TEXT, model TEXT, width INTEGER, height INTEGER, steps INTEGER, "
+                    "lora_path TEXT, lora_scale REAL, created_at REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_generations_sha256 ON generations (sha256)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_generations_prompt ON generations (prompt)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_generations_provider ON generations (provider, model)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_generations_created_at ON generations (created_at)")
+            self._initialized = True
+        return conn
+    
+    def path_for(self, sha256, extension):
+        """Return the sharded path of an image with the given hash"""
+        return os.path.join(self.root, sha256[:2], sha256[2:4], f"{sha256}.{extension}")
+    
+    def put(self, image_bytes, metadata=None, image_format=None):
+        """
+        Store an image and record the generation that produced it
+        
+        Args:
+            image_bytes (bytes): Encoded image as returned by the provider
+            metadata (dict, optional): prompt, provider, model, width, height,
+                steps, lora_path and lora_scale of the generation
+            image_format (str, optional): Convert the image to this format first
+            
+        Returns:
+            dict: sha256, name, path and createdAt of the stored image
+        """
+        with timed_stage("save"):
+            return self._put(image_bytes, metadata, image_format)
+        
+    def _put(self, image_bytes, metadata, image_format):
+        image_bytes, image_format = encode_image_bytes(image_bytes, image_format)
+        sha256 = hashlib.sha256(image_bytes).hexdigest()
+        name = f"{sha256}.{IMAGE_EXTENSIONS[image_format]}"
+        path = self.path_for(sha256, IMAGE_EXTENSIONS[image_format])
+        now = time.time()
+        
+        # Identical bytes map to the same path, so an existing file is already correct
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(image_bytes)
+            os.replace(temp_path, path)
+            
+        metadata = metadata or {}
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO images (sha256, name, path, format, size_bytes, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (sha256, name, path, image_format, len(image_bytes), now)
+                )
+                conn.execute(
+                    "INSERT INTO generations (sha256, prompt, provider, model, width, height, steps, "
+                    "lora_path, lora_scale, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (sha256, metadata.get("prompt"), metadata.get("provider"), metadata.get("model"),
+                     metadata.get("width"), metadata.get("height"), metadata.get("steps"),
+                     metadata.get("lora_path"), metadata.get("lora_scale"), now)
+                )
+            conn.close()
+            
+        return {"sha256": sha256, "name": name, "path": path, "createdAt": now}
+    
+    def lookup(self, name):
+        """
+        Find a stored image by its public name
+        
+        Args:
+            name (str): Image name, i.e. "<sha256>.<ext>"
+            
+        Returns:
+            str: Path of the image, or None if it is not in the catalog
+        """
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT path FROM images WHERE name = ?", (name,)).fetchone()
+            conn.close()
+        return row["path"] if row else None
+    
+    def generations(self, sha256):
+        """Return every recorded generation of an image, oldest first"""
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT * FROM generations WHERE sha256 = ? ORDER BY created_at", (sha256,)
+            ).fetchall()
+            conn.close()
+        return [dict(row) for row in rows]
+
+
+# Shared image store under generated_images/
+image_store = ImageStore()
+
+
+class ImageResultCache:
+    """
+    Disk-backed cache of seeded Together generations with LRU size eviction
+    
+    With an explicit seed a generation is deterministic, so the same prompt,
+    model, size, steps, LoRA and seed always produce the same image. Image
+    bytes are stored as files under root; a SQLite index tracks their size and
+    last access so the least recently used files are evicted first.
+    """
+    
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or os.environ.get("IMAGE_RESULT_CACHE_DIR", os.path.join(".cache", "image_results"))
+        self.index_path = os.path.join(self.root, "index.sqlite")
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.environ.get("IMAGE_RESULT_CACHE_MAX_BYTES", str(1024 ** 3)))
+        self._lock = threading.Lock()
+        self._initialized = False
+        
+    def _connect(self):
+        os.makedirs(self.root, exist_ok=True)
+        conn = sqlite3.connect(self.index_path, timeout=10)
+        if not self._initialized:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS image_results ("
+                "key TEXT PRIMARY KEY, size_bytes INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_image_results_last_access ON image_results (last_access)")
+            self._initialized = True
+        return conn
+    
+    @staticmethod
+    def make_key(prompt, model, width, height, steps, lora_path, lora_scale, seed):
+        """Build the cache key for one seeded generation"""
+        raw = json.dumps([prompt, model, width, height, steps, lora_path, lora_scale, seed])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    def path_for(self, key):
+        """Return the file that holds the image for a key"""
+        return os.path.join(self.root, key[:2], f"{key}.img")
+    
+    def get(self, key):
+        """
+        Look up a cached image
+        
+        Args:
+            key (str): Key from make_key
+            
+        Returns:
+            bytes: Encoded image, or None on a miss
+        """
+        try:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    row = conn.execute("SELECT size_bytes FROM image_results WHERE key = ?", (key,)).fetchone()
+                    if row:
+                        conn.execute("UPDATE image_results SET last_access = ? WHERE key = ?", (time.time(), key))
+                conn.close()
+            if row is None:
+                return None
+            with open(self.path_for(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            # The file was removed behind our back; forget the entry
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.execute("DELETE FROM image_results WHERE key = ?", (key,))
+                conn.close()
+        except Exception as e:
+            logger.warning("Error reading image result cache: %s", e)
+        return None
+    
+    def put(self, key, image_bytes):
+        """
+        Store an image and evict least recently used images over max_bytes
+        
+        Args:
+            key (str): Key from make_key
+            image_bytes (bytes): Encoded image as returned by the provider
+        """
+        path = self.path_for(key)
+        now = time.time()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(image_bytes)
+            os.replace(temp_path, path)
+            
+            evicted = []
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO image_results (key, size_bytes, created_at, last_access) "
+                        "VALUES (?, ?, ?, ?)",
+                        (key, len(image_bytes), now, now)
+                    )
+                    total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM image_results").fetchone()[0]
+                    if total > self.max_bytes:
+                        rows = conn.execute("SELECT key, size_bytes FROM image_results ORDER BY last_access").fetchall()
+                        for old_key, size_bytes in rows:
+                            if total <= self.max_bytes:
+                                break
+                            evicted.append(old_key)
+                            total -= size_bytes
+                        conn.executemany("DELETE FROM image_results WHERE key = ?", [(old_key,) for old_key in evicted])
+                conn.close()
+            for old_key in evicted:
+                try:
+                    os.remove(self.path_for(old_key))
+                except OSError:
+                    pass
+        except Exception as e:
+            logger.warning("Error writing image result cache: %s", e)
+
+
+# Shared cache of seeded generations. Opt in with IMAGE_RESULT_CACHE=1.
+image_result_cache = ImageResultCache()
+IMAGE_RESULT_CACHE_ENABLED = os.environ.get("IMAGE_RESULT_CACHE", "").lower() in ("1", "true", "yes")
+
+
+# Derivatives built for every stored image: name -> (max size, WebP quality)
+DERIVATIVE_SIZES = {"thumb": (320, 70), "preview": (1024, 80)}
+
+
+def make_derivatives(image_path):
+    """
+    Build the WebP thumbnail and preview of an image next to the original
+    
+    Runs in a worker process. Existing derivatives are reused.
+    
+    Args:
+        image_path (str): Path of the full-resolution image
+        
+    Returns:
+        dict: Derivative name -> path
     """
-    Use the Nillion API to generate detailed image prompts from a simple concept
+    stem = os.path.splitext(image_path)[0]
+    paths = {name: f"{stem}.{name}.webp" for name in DERIVATIVE_SIZES}
+    if all(os.path.exists(path) for path in paths.values()):
+        return paths
+    
+    from PIL import Image
+    
+    with Image.open(image_path) as image:
+        image.load()
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGB")
+        for name, (max_size, quality) in DERIVATIVE_SIZES.items():
+            derivative = image.copy()
+            derivative.thumbnail((max_size, max_size))
+            derivative.save(paths[name], format="WEBP", quality=quality)
+    return paths
+
+
+def create_derivatives(image_paths, max_workers=None):
+    """
+    Build derivatives for several images in a process pool
     
     Args:
-        concept (str): Simple concept like "on beach"
-        num_prompts (int): Number of different prompts to generate
-        include_nelson (bool): Whether to include n3lson in the prompts
+        image_paths (list): Paths of full-resolution images
+        max_workers (int, optional): Number of worker processes
+            (DERIVATIVE_WORKERS, defaulting to the CPU count)
         
     Returns:
-        list: List of generated detailed prompts
+        list: Derivative paths for each image, or None where building them failed
     """
-    try:
-        # Get environment variables for Nillion API
-        api_url = os.environ.get("NILAI_API_URL", "https://nilai-a779.nillion.network")
-        api_key = os.environ.get("NILAI_API_KEY", "Nillion2025")
-        
-        # Prepare system message to instruct LLM to generate image prompts
-        if include_nelson:
-            system_message = """
-            You are a specialized image prompt generator. 
-            Create detailed, high-quality image prompts for the concept provided.
-            Each prompt should be different but related to the same concept. Max of 10 words.
-            Make the prompts specific, visual, and detailed enough for an image generation model.
-            Prompt MUST start with 'n3lson man', eg: 'n3lson man on beach' since 'n3lson' is the keyword for the image fine tuned model.
-            ONLY return the prompts, one per line, with no additional explanation or commentary.
-            """
-        else:
-            system_message = """
-            You are a specialized image prompt generator. 
-            Create detailed, high-quality image prompts for the concept provided.
-            Each prompt should be different but related to the same concept. Max of 10 words.
-            Make the prompts specific, visual, and detailed enough for an image generation model.
-            ONLY return the prompts, one per line, with no additional explanation or commentary.
-            """
+    if not image_paths:
+        return []
+    max_workers = max_workers or int(os.environ.get("DERIVATIVE_WORKERS", str(os.cpu_count() or 1)))
+    
+    results = []
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(image_paths))) as executor:
+        futures = [executor.submit(make_derivatives, image_path) for image_path in image_paths]
+        for image_path, future in zip(image_paths, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"Error creating derivatives for {image_path}: {e}")
+                results.append(None)
+    return results
+
+
+class StoryUploadError(Exception):
+    """Raised when the Story Protocol uploader reports a failed upload"""
+
+
+class StoryUploaderDaemon:
+    """
+    Long-lived Node.js uploader process speaking JSON lines over stdin/stdout
+    
+    The Node process loads the Pinata and Story SDKs once and handles many
+    uploads concurrently. Every request carries an id and gets its own response
+    line, so concurrent uploads never share a result file. The process is
+    started on first use and restarted automatically if it exits.
+    """
+    
+    def __init__(self, script_path=None, start_timeout=60, command=None):
+        self.script_path = script_path or os.path.join("story-integration", "storyUploader.js")
+        self.start_timeout = start_timeout
+        # STORY_UPLOADER_CMD swaps in another process speaking the same protocol
+        if command is None and os.environ.get("STORY_UPLOADER_CMD"):
+            command = shlex.split(os.environ["STORY_UPLOADER_CMD"])
+        self.command = command or ["node", self.script_path, "--daemon"]
+        self._process = None
+        self._pending = {}
+        self._ready = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
         
-        # Prepare the request
-        url = f"{api_url}/v1/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
-        payload = {
-            "model": "meta-llama/Llama-3.1-8B-Instruct",
-            "messages": [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": f"Generate {num_prompts} different detailed image prompts for the concept: '{concept}'"}
-            ],
-            "temperature": 0.7,  # Slightly higher temperature for creativity
-        }
+    def _start(self):
+        # Requests sent to a previous process will never be answered
+        stale, self._pending = self._pending, {}
+        for future in stale.values():
+            future.set_exception(StoryUploadError("Story Protocol uploader restarted"))
+            
+        print(f"Starting Story Protocol uploader daemon ({' '.join(self.command)})...")
+        self._process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            bufsize=1
+        )
+        self._ready = Future()
+        threading.Thread(target=self._read_responses, args=(self._process, self._ready),
+                         name="story-uploader-stdout", daemon=True).start()
+        threading.Thread(target=self._relay_logs, args=(self._process,),
+                         name="story-uploader-stderr", daemon=True).start()
         
-        # Make the API call
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
+    def _read_responses(self, process, ready):
+        for line in process.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                print(f"Ignoring malformed uploader output: {line.strip()}")
+                continue
+            
+            if message.get("type") == "ready":
+                print(f"Story Protocol uploader ready (account {message.get('address')})")
+                ready.set_result(True)
+                continue
+            
+            with self._lock:
+                future = self._pending.pop(message.get("id"), None)
+            if future is None:
+                continue
+            if message.get("ok"):
+                future.set_result(message.get("result"))
+            else:
+                future.set_exception(StoryUploadError(message.get("error", "Unknown upload error")))
+                
+        # The process exited: fail everything still waiting on it
+        exit_code = process.wait()
+        error = StoryUploadError(f"Story Protocol uploader exited with code {exit_code}")
+        if not ready.done():
+            ready.set_exception(error)
+        with self._lock:
+            if self._process is process:
+                pending, self._pending = self._pending, {}
+            else:
+                pending = {}
+        for future in pending.values():
+            future.set_exception(error)
+            
+    def _relay_logs(self, process):
+        for line in process.stderr:
+            print(f"[story-uploader] {line.rstrip()}")
+            
+    def _ensure_running(self):
+        with self._lock:
+            if self._process is None or self._process.poll() is not None:
+                self._start()
+            ready = self._ready
+        ready.result(timeout=self.start_timeout)
         
-        # Parse the response
-        result = response.json()
-        generated_text = result['choices'][0]['message']['content']
+    def request(self, payload, timeout=None):
+        """
+        Send one request to the uploader and wait for its response
         
-        # Split text into individual prompts (one per line)
-        prompts = [p.strip() for p in generated_text.strip().split('\n') if p.strip()]
+        Args:
+            payload (dict): Request body; "type" selects the operation
+            timeout (float, optional): Seconds to wait for the response
+            
+        Returns:
+            The "result" field of the response
+            
+        Raises:
+            StoryUploadError: If the uploader reports an error or exits
+        """
+        with timed_stage("story_upload", operation=payload.get("type")):
+            try:
+                self._ensure_running()
+                future = Future()
+                with self._lock:
+                    request_id = next(self._ids)
+                    self._pending[request_id] = future
+                    try:
+                        self._process.stdin.write(json.dumps(dict(payload, id=request_id)) + "\n")
+                        self._process.stdin.flush()
+                    except OSError as e:
+                        self._pending.pop(request_id, None)
+                        raise StoryUploadError(f"Could not reach Story Protocol uploader: {e}")
+                try:
+                    return future.result(timeout=timeout)
+                except FutureTimeoutError:
+                    with self._lock:
+                        self._pending.pop(request_id, None)
+                    raise StoryUploadError(f"Story Protocol uploader did not answer within {timeout:g}s")
+            except Exception:
+                metrics.inc("story_provider_errors_total", provider="story")
+                raise
+    
+    def upload(self, image_path, prompt, timeout=None):
+        """
+        Upload an image to IPFS and register it on Story Protocol
         
-        # Limit to requested number of prompts
-        prompts = prompts[:num_prompts]
+        Returns:
+            dict: txHash, ipfsCid, ipId and explorer URLs of the registration
+        """
+        return self.request({"type": "upload", "imagePath": image_path, "prompt": prompt}, timeout)
+    
+    def upload_batch(self, images, timeout=None):
+        """
+        Upload several images as one pipelined batch
         
-        print(f"Generated {len(prompts)} image prompts:")
-        for i, prompt in enumerate(prompts):
-            print(f"{i+1}. {prompt}")
+        Args:
+            images (list): (image_path, prompt) pairs
+            timeout (float, optional): Seconds each image may take. The uploader
+                reports a slower image as a failed record, and the whole request
+                fails if no response arrives shortly after
             
-        return prompts
+        Returns:
+            list: One record per image, in order, with imagePath, ok and either
+                result or error
+        """
+        items = [{"imagePath": image_path, "prompt": prompt} for image_path, prompt in images]
+        payload = {"type": "batch", "items": items}
+        if timeout is None:
+            return self.request(payload)
+        return self.request(dict(payload, timeout=timeout), timeout + STORY_RESPONSE_GRACE)
+    
+    def close(self):
+        """Stop the uploader process; it is restarted on the next request"""
+        with self._lock:
+            process, self._process = self._process, None
+        if process and process.poll() is None:
+            process.stdin.close()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+# Shared uploader process for every Story Protocol upload
+story_uploader = StoryUploaderDaemon()
+atexit.register(story_uploader.close)
+
+# Seconds each image of a Story Protocol batch may take, and how much longer to
+# wait for the uploader's response before giving up on it
+STORY_UPLOAD_TIMEOUT = float(os.environ.get("STORY_UPLOAD_TIMEOUT", "300"))
+STORY_RESPONSE_GRACE = 30
+
+
+def _remove_spool_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class GeneratedImage:
+    """
+    One generated image, spooled to disk as soon as it arrives
+    
+    Only the prompt, parameters and the spool file path stay in memory. The
+    bytes are read back, and base64 encoded, only when accessed. The spool file
+    is removed when the record is garbage collected.
+    """
+    
+    __slots__ = ("index", "prompt", "params", "spool_path", "size", "format", "__weakref__")
+    
+    def __init__(self, image_bytes, prompt, params=None, index=0):
+        self.index = index
+        self.prompt = prompt
+        self.params = params or {}
+        self.size = len(image_bytes)
+        self.format = detect_image_format(image_bytes)
         
-    except Exception as error:
-        print(f"Error generating prompts: {error}")
-        # Fallback prompts if API call fails
-        if include_nelson:
-            return [f"n3lson {concept} realistic photo high definition" for _ in range(num_prompts)]
-        else:
-            return [f"{concept} realistic photo high definition" for _ in range(num_prompts)]
+        spool_dir = os.environ.get("IMAGE_SPOOL_DIR") or os.path.join(tempfile.gettempdir(), "story-image-spool")
+        os.makedirs(spool_dir, exist_ok=True)
+        with timed_stage("spool"):
+            fd, self.spool_path = tempfile.mkstemp(dir=spool_dir, suffix=".img")
+            with os.fdopen(fd, "wb") as f:
+                f.write(image_bytes)
+        weakref.finalize(self, _remove_spool_file, self.spool_path)
+        
+    @classmethod
+    def from_base64(cls, image_b64, prompt, params=None, index=0):
+        """Decode a provider's base64 payload straight into a spooled record"""
+        with timed_stage("decode"):
+            image_bytes = base64.b64decode(image_b64)
+        return cls(image_bytes, prompt, params, index)
+    
+    def read(self):
+        """Return the encoded image bytes"""
+        with open(self.spool_path, "rb") as f:
+            return f.read()
+    
+    @property
+    def b64(self):
+        """Base64 encoded image, built on access"""
+        return base64.b64encode(self.read()).decode("utf-8")
+
+
+# Most images requested in one Together call when a prompt repeats
+TOGETHER_MAX_N = int(os.environ.get("TOGETHER_MAX_N", "4"))
 
 
 class ImageGenerator:
@@ -112,24 +1697,182 @@ class ImageGenerator:
         
         # Initialize Together client if available
         if self.together_api_key:
-            self.together_client = Together(api_key=self.together_api_key)
+            self.together_client = clients.together(self.together_api_key)
         else:
             self.together_client = None
             
-        self.generated_images = []
-        self.prompts_used = []
+        self.results = []  # GeneratedImage records of the last generation run
         self.image_files = []  # To track saved image files
+        self.upload_records = []  # Per-image outcome of the last Story Protocol upload
+        self.last_error = None  # Most recent provider error, for callers that need more than an empty result
+        
+        # Pooled keep-alive session shared across requests and threads
+        self.ablo_session = clients.session("ablo")
+        
+    @property
+    def generated_images(self):
+        """Base64 encoded images of the last run, decoded from the spool on access"""
+        return [result.b64 for result in self.results]
+    
+    @property
+    def prompts_used(self):
+        """Prompts of the last run, aligned with generated_images"""
+        return [result.prompt for result in self.results]
+        
+    def iter_images_with_together(self, prompts, 
+                                  model="black-forest-labs/FLUX.1-dev-lora",
+                                  width=1024, 
+                                  height=768, 
+                                  steps=28,
+                                  lora_path="http://hills.ccsf.edu/~clai74/nelson_unet.safetensors",
+                                  lora_scale=1.0,
+                                  max_concurrency=1,
+                                  seed=None,
+                                  max_n=None):
+        """
+        Generate one image for each provided prompt using Together API, yielding
+        each image as soon as it is ready
+        
+        Takes the same arguments as generate_images_with_together.
+            
+        Yields:
+            GeneratedImage: Spooled image, in completion order. Prompts that
+                fail are skipped.
+        """
+        if not self.together_api_key:
+            raise ValueError("TOGETHER_API_KEY is required for Together image generation. Add it to .env file.")
+        
+        params = {
+            "provider": "together",
+            "model": model,
+            "width": width,
+            "height": height,
+            "steps": steps,
+            "lora_path": lora_path,
+            "lora_scale": lora_scale,
+            "seed": seed
+        }
+        # Only seeded generations are deterministic, and so safe to cache
+        use_result_cache = IMAGE_RESULT_CACHE_ENABLED and seed is not None
+        seed_args = {"seed": seed} if seed is not None else {}
+        
+        # With the result cache every image is its own call. Repeats of a prompt
+        # get seed + j, so they are distinct images with their own cache entries.
+        seeds = {}
+        if use_result_cache:
+            repeats = {}
+            for i, prompt in enumerate(prompts):
+                seeds[i] = seed + repeats.get(prompt, 0)
+                repeats[prompt] = repeats.get(prompt, 0) + 1
         
+        def generate_one(i, prompt):
+            try:
+                cache_key = None
+                image_params, image_seed_args = params, seed_args
+                if use_result_cache:
+                    image_params, image_seed_args = dict(params, seed=seeds[i]), {"seed": seeds[i]}
+                    cache_key = ImageResultCache.make_key(prompt, model, width, height, steps,
+                                                          lora_path, lora_scale, seeds[i])
+                    cached_image = image_result_cache.get(cache_key)
+                    metrics.inc("story_image_result_cache_total", result="hit" if cached_image else "miss")
+                    if cached_image:
+                        print(f"Image {i+1} served from the image result cache")
+                        return GeneratedImage(cached_image, prompt, image_params, i)
+                
+                print(f"Generating image {i+1}/{len(prompts)} with Together...")
+                with timed_stage("provider_generate", provider="together"):
+                    response = provider_guard("together").call(
+                        self.together_client.images.generate,
+                        prompt=prompt,
+                        model=model,
+                        width=width,
+                        height=height,
+                        steps=steps,
+                        n=1,
+                        response_format="b64_json",
+                        image_loras=[{"path": lora_path, "scale": lora_scale}],
+                        **image_seed_args
+                    )
+                
+                if response.data and len(response.data) > 0:
+                    print(f"Image {i+1} generated successfully")
+                    result = GeneratedImage.from_base64(response.data[0].b64_json, prompt, image_params, i)
+                    if cache_key:
+                        image_result_cache.put(cache_key, result.read())
+                    return result
+                print(f"No image data returned for prompt {i+1}")
+            except Exception as e:
+                self.last_error = e
+                metrics.inc("story_provider_errors_total", provider="together")
+                logger.warning("Together generation failed for prompt %d: %s", i + 1, e)
+            return None
+        
+        def generate_group(_, group):
+            # k copies of one prompt become a single n=k call
+            prompt, indices = group
+            if len(indices) == 1:
+                result = generate_one(indices[0], prompt)
+                return [result] if result is not None else []
+            try:
+                print(f"Generating {len(indices)} images of prompt {indices[0]+1}/{len(prompts)} "
+                      f"with one Together call...")
+                with timed_stage("provider_generate", provider="together"):
+                    response = provider_guard("together").call(
+                        self.together_client.images.generate,
+                        prompt=prompt,
+                        model=model,
+                        width=width,
+                        height=height,
+                        steps=steps,
+                        n=len(indices),
+                        response_format="b64_json",
+                        image_loras=[{"path": lora_path, "scale": lora_scale}],
+                        **seed_args
+                    )
+                
+                images = (response.data or [])[:len(indices)]
+                if len(images) < len(indices):
+                    print(f"Together returned {len(images)} of {len(indices)} images for prompt '{prompt}'")
+                print(f"Images {', '.join(str(i+1) for i in indices[:len(images)])} generated successfully")
+                return [GeneratedImage.from_base64(image.b64_json, prompt, params, i)
+                        for i, image in zip(indices, images)]
+            except Exception as e:
+                self.last_error = e
+                metrics.inc("story_provider_errors_total", provider="together")
+                logger.warning("Together generation failed for prompts %s: %s", [i + 1 for i in indices], e)
+                return []
+        
+        # Group identical prompts, up to max_n images per call. With the result
+        # cache they stay one image per call, each with its own seed and cache entry.
+        max_n = max_n or TOGETHER_MAX_N
+        if use_result_cache:
+            max_n = 1
+        indices_by_prompt = OrderedDict()
+        for i, prompt in enumerate(prompts):
+            indices_by_prompt.setdefault(prompt, []).append(i)
+        groups = [(prompt, indices[start:start + max_n])
+                  for prompt, indices in indices_by_prompt.items()
+                  for start in range(0, len(indices), max_n)]
+        
+        for _, results in iter_bounded(generate_group, groups, max_concurrency):
+            yield from results
+                
     def generate_images_with_together(self, prompts, 
                                model="black-forest-labs/FLUX.1-dev-lora",
                                width=1024, 
                                height=768, 
                                steps=28,
                                lora_path="http://hills.ccsf.edu/~clai74/nelson_unet.safetensors",
-                               lora_scale=1.0):
+                               lora_scale=1.0,
+                               max_concurrency=1,
+                               seed=None,
+                               max_n=None):
         """
         Generate one image for each provided prompt using Together API
         
+        Repeated prompts are batched into one images.generate(n=k) call each, so
+        k variations of one prompt cost a single round trip.
+        
         Args:
             prompts (list): List of text prompts to generate images from
             model (str): Model name to use
@@ -138,64 +1881,51 @@ class ImageGenerator:
             steps (int): Number of inference steps
             lora_path (str): Path to LoRA adapter
             lora_scale (float): Scale factor for LoRA adapter
+            max_concurrency (int): Maximum number of Together calls in flight at once.
+                1 generates the images one after another.
+            seed (int, optional): Fixed seed for reproducible images. Seeded
+                results are served from the image result cache when it is enabled.
+            max_n (int, optional): Most images requested per call for a repeated
+                prompt. Defaults to TOGETHER_MAX_N; 1 disables batching.
             
         Returns:
-            list: List of base64 encoded images
+            list: GeneratedImage records, in prompt order. Failed prompts are left out.
         """
-        if not self.together_api_key:
-            raise ValueError("TOGETHER_API_KEY is required for Together image generation. Add it to .env file.")
-            
-        images = []
-        self.prompts_used = []
-        
-        for i, prompt in enumerate(prompts):
-            try:
-                print(f"Generating image {i+1}/{len(prompts)} with Together...")
-                response = self.together_client.images.generate(
-                    prompt=prompt,
-                    model=model,
-                    width=width,
-                    height=height,
-                    steps=steps,
-                    n=1,
-                    response_format="b64_json",
-                    image_loras=[{"path": lora_path, "scale": lora_scale}]
-                )
-                
-                # Store the generated image
-                if response.data and len(response.data) > 0:
-                    images.append(response.data[0].b64_json)
-                    self.prompts_used.append(prompt)
-                    print(f"Image {i+1} generated successfully")
-                else:
-                    print(f"No image data returned for prompt {i+1}")
-                    
-            except Exception as e:
-                print(f"Error generating image {i+1}: {e}")
-                
-        # Store all generated images
-        self.generated_images = images
-        
-        return images
+        results = self.iter_images_with_together(prompts, model, width, height, steps,
+                                                 lora_path, lora_scale, max_concurrency, seed, max_n)
+        self.results = sorted(results, key=lambda result: result.index)
+        return self.results
     
-    def generate_images_with_ablo(self, prompts, style_id="a58f5b3c-2263-4072-8242-f23c52315125"):
+    def iter_images_with_ablo(self, prompts, style_id="a58f5b3c-2263-4072-8242-f23c52315125",
+                              max_concurrency=1):
         """
-        Generate images for each provided prompt using Ablo API
+        Generate images for each provided prompt using Ablo API, yielding each
+        prompt's variants as soon as they are downloaded
         
-        Args:
-            prompts (list): List of text prompts to generate images from
-            style_id (str): Style ID for Ablo image generation
-            
-        Returns:
-            list: List of base64 encoded images
+        Takes the same arguments as generate_images_with_ablo.
+        
+        Yields:
+            GeneratedImage: Spooled image variant. Prompts are yielded in completion
+                order, each prompt's variants together and in order.
         """
         if not self.ablo_api_key:
             raise ValueError("ABLO_KEY is required for Ablo image generation. Add it to .env file.")
-            
-        images = []
-        self.prompts_used = []
         
-        for i, prompt in enumerate(prompts):
+        params = {"provider": "ablo", "model": style_id}
+        
+        def download_variant(j, image_url):
+            try:
+                with timed_stage("provider_download", provider="ablo"):
+                    image_response = self.ablo_session.get(image_url, timeout=provider_timeout("ablo"))
+                    image_response.raise_for_status()
+                    return image_response.content
+            except Exception as e:
+                self.last_error = e
+                metrics.inc("story_provider_errors_total", provider="ablo")
+                logger.warning("Ablo variant %d download from %s failed: %s", j + 1, image_url, e)
+                return None
+        
+        def generate_one(i, prompt):
             try:
                 print(f"Generating image {i+1}/{len(prompts)} with Ablo...")
                 
@@ -210,7 +1940,7 @@ class ImageGenerator:
                     ablo_prompt = prompt
                 
                 # Make the API call to Ablo
-                url = "https://api.ablo.ai/image-maker"
+                url = f"{os.environ.get('ABLO_API_URL', 'https://api.ablo.ai')}/image-maker"
                 headers = {
                     "Content-Type": "application/json",
                     "x-api-key": self.ablo_api_key
@@ -220,65 +1950,73 @@ class ImageGenerator:
                     "freeText": ablo_prompt
                 }
                 
-                response = requests.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                
-                # Parse the response
-                result = response.json()
+                with timed_stage("provider_generate", provider="ablo"):
+                    result = provider_guard("ablo").call(post_json, self.ablo_session, url,
+                                                         headers=headers, json=payload,
+                                                         timeout=provider_timeout("ablo"))
                 
                 # Extract image URLs from the response - Ablo returns multiple images
                 if "images" in result and result["images"]:
-                    for img_data in result["images"]:
-                        if "url" in img_data:
-                            # Fetch the image from URL and convert to base64
-                            image_url = img_data["url"]
-                            image_response = requests.get(image_url)
-                            image_response.raise_for_status()
-                            image_bytes = image_response.content
-                            image_base64 = base64.b64encode(image_bytes).decode("utf-8")
-                            images.append(image_base64)
-                            self.prompts_used.append(f"{prompt} (variant {len(images)})")
-                            print(f"Image variant {len(images)} for prompt {i+1} generated successfully")
-                else:
-                    print(f"No image data returned from Ablo for prompt {i+1}")
-                    
+                    image_urls = [img_data["url"] for img_data in result["images"] if "url" in img_data]
+                    variants = []
+                    # Spool each variant as soon as it is downloaded
+                    for j, image_bytes in iter_bounded(download_variant, image_urls, len(image_urls)):
+                        if image_bytes is not None:
+                            variants.append((j, GeneratedImage(image_bytes, f"{prompt} (variant {j+1})", params, i)))
+                    variants = [variant for _, variant in sorted(variants, key=lambda item: item[0])]
+                    print(f"{len(variants)} image variants for prompt {i+1} generated successfully")
+                    return variants
+                print(f"No image data returned from Ablo for prompt {i+1}")
             except Exception as e:
-                print(f"Error generating image {i+1} with Ablo: {e}")
-                
-        # Store all generated images
-        self.generated_images = images
+                self.last_error = e
+                metrics.inc("story_provider_errors_total", provider="ablo")
+                logger.warning("Ablo generation failed for prompt %d: %s", i + 1, e)
+            return []
+        
+        for _, variants in iter_bounded(generate_one, prompts, max_concurrency):
+            yield from variants
+    
+    def generate_images_with_ablo(self, prompts, style_id="a58f5b3c-2263-4072-8242-f23c52315125",
+                                  max_concurrency=1):
+        """
+        Generate images for each provided prompt using Ablo API
         
-        return images
+        Args:
+            prompts (list): List of text prompts to generate images from
+            style_id (str): Style ID for Ablo image generation
+            max_concurrency (int): Maximum number of image-maker calls in flight at once.
+                The variant downloads for each prompt always run in parallel.
+            
+        Returns:
+            list: GeneratedImage records, in prompt and variant order
+        """
+        results = self.iter_images_with_ablo(prompts, style_id, max_concurrency)
+        self.results = sorted(results, key=lambda result: result.index)
+        return self.results
     
-    def save_all_images(self):
+    def save_all_images(self, image_format=None):
         """
-        Save all generated images to disk
+        Save all generated images to the content-addressed image store
+        
+        Args:
+            image_format (str, optional): Convert every image to this format
+                ("png", "jpeg" or "webp"). By default images are written in the
+                format the provider returned, without re-encoding.
         
         Returns:
-            list: Paths of saved images
+            list: (path, prompt) of each saved image
         """
-        if not self.generated_images:
+        if not self.results:
             print("No images to save")
             return []
             
         image_paths = []
         
-        # Create directory for saved images if it doesn't exist
-        os.makedirs("generated_images", exist_ok=True)
-        
-        for i, (img_data, prompt) in enumerate(zip(self.generated_images, self.prompts_used)):
-            # Generate a unique filename based on timestamp and index
-            import time
-            timestamp = int(time.time())
-            filename = f"generated_images/image_{timestamp}_{i}.png"
-            
+        for i, result in enumerate(self.results):
             try:
-                # Convert base64 to image and save
-                image_data = base64.b64decode(img_data)
-                image = Image.open(io.BytesIO(image_data))
-                image.save(filename)
-                print(f"Image {i+1} saved to {filename}")
-                image_paths.append((filename, prompt))
+                stored = image_store.put(result.read(), dict(result.params, prompt=result.prompt), image_format)
+                print(f"Image {i+1} saved to {stored['path']}")
+                image_paths.append((stored["path"], result.prompt))
             except Exception as e:
                 print(f"Error saving image {i+1}: {e}")
                 
@@ -289,11 +2027,15 @@ class ImageGenerator:
         """
         Upload a specific image or all images to Story Protocol
         
+        All images are sent to the uploader daemon as one batch, so IPFS pinning
+        of later images overlaps the on-chain registration of earlier ones. The
+        outcome of every image, success or failure, is kept in self.upload_records.
+        
         Args:
             image_index (int, optional): Index of the image to upload. If None, uploads all images.
             
         Returns:
-            list: List of upload results
+            list: List of successful upload results
         """
         if not self.image_files:
             # Save images first if they haven't been saved
@@ -303,81 +2045,50 @@ class ImageGenerator:
             print("No images available to upload")
             return []
             
-        results = []
-        
         # Determine which images to upload
         images_to_upload = [self.image_files[image_index]] if image_index is not None else self.image_files
         
+        print("")
+        print("=" * 70)
+        print(f"Uploading {len(images_to_upload)} image(s) to Story Protocol")
         for image_path, prompt in images_to_upload:
-            try:
-                print("")
-                print("=" * 70)
-                print(f"Uploading image '{image_path}' to Story Protocol")
-                print(f"Prompt: '{prompt}'")
-                print("=" * 70)
-                
-                # Call the Node.js script to upload the image
-                script_path = os.path.join("story-integration", "storyUploader.js")
-                
-                # Run the script and show real-time output
-                process = subprocess.Popen(
-                    ["node", script_path, image_path, prompt],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    bufsize=1
-                )
-                
-                # Print output in real-time
-                for line in process.stdout:
-                    print(line.strip())
-                
-                # Wait for the process to complete
-                exit_code = process.wait()
-                
-                # Check if upload was successful
-                if exit_code == 0:
-                    # Try to read the result from the JSON file
-                    try:
-                        result_file = os.path.join("story-integration", "upload_result.json")
-                        with open(result_file, "r") as f:
-                            upload_result = json.load(f)
-                            
-                        # Try to also load the debug file if it exists
-                        debug_file = os.path.join("story-integration", "upload_result_debug.txt")
-                        debug_content = ""
-                        if os.path.exists(debug_file):
-                            with open(debug_file, "r") as f:
-                                debug_content = f.read()
-                            print("\nDEBUG INFO:")
-                            print(debug_content)
-                        
-                        # Print transaction summary
-                        print("")
-                        print("=" * 70)
-                        print("TRANSACTION SUMMARY")
-                        print("=" * 70)
-                        print(f"Transaction Hash: {upload_result.get('txHash', 'N/A')}")
-                        print(f"Transaction Hash Length: {len(str(upload_result.get('txHash', '')))}")
-                        print(f"IPFS Hash: {upload_result.get('ipfsCid', 'N/A')}")
-                        print(f"IPFS Hash Length: {len(str(upload_result.get('ipfsCid', '')))}")
-                        print(f"IP Asset ID: {upload_result.get('ipId', 'N/A')}")
-                        print(f"IP Asset URL: {upload_result.get('ipAssetUrl', 'N/A')}")
-                        print(f"Explorer: {upload_result.get('explorerUrl', 'N/A')}")
-                        print(f"Image IPFS: {upload_result.get('viewUrl', 'N/A')}")
-                        print("=" * 70)
-                        
-                        results.append(upload_result)
-                    except Exception as e:
-                        print(f"Error reading upload result: {e}")
-                else:
-                    # Read error output
-                    stderr = process.stderr.read()
-                    print(f"Error uploading to Story Protocol (exit code {exit_code}):")
-                    print(stderr)
-                    
-            except Exception as e:
-                print(f"Error in upload process: {e}")
+            print(f"  '{image_path}' - Prompt: '{prompt}'")
+        print("=" * 70)
+        
+        try:
+            records = story_uploader.upload_batch(images_to_upload, timeout=STORY_UPLOAD_TIMEOUT)
+        except Exception as e:
+            print(f"Error in upload process: {e}")
+            records = [{"imagePath": image_path, "ok": False, "error": str(e)} for image_path, _ in images_to_upload]
+            
+        results = []
+        self.upload_records = []
+        for (image_path, prompt), record in zip(images_to_upload, records):
+            record = dict(record, prompt=prompt)
+            self.upload_records.append(record)
+            
+            if not record.get("ok"):
+                print(f"Error uploading '{image_path}' to Story Protocol: {record.get('error')}")
+                continue
+            
+            upload_result = record["result"]
+            
+            # Print transaction summary
+            print("")
+            print("=" * 70)
+            print(f"TRANSACTION SUMMARY: {image_path}")
+            print("=" * 70)
+            print(f"Transaction Hash: {upload_result.get('txHash', 'N/A')}")
+            print(f"Transaction Hash Length: {len(str(upload_result.get('txHash', '')))}")
+            print(f"IPFS Hash: {upload_result.get('ipfsCid', 'N/A')}")
+            print(f"IPFS Hash Length: {len(str(upload_result.get('ipfsCid', '')))}")
+            print(f"IP Asset ID: {upload_result.get('ipId', 'N/A')}")
+            print(f"IP Asset URL: {upload_result.get('ipAssetUrl', 'N/A')}")
+            print(f"Explorer: {upload_result.get('explorerUrl', 'N/A')}")
+            print(f"Image IPFS: {upload_result.get('viewUrl', 'N/A')}")
+            print("=" * 70)
+            
+            results.append(upload_result)
                 
         return results
     
@@ -392,15 +2103,19 @@ class ImageGenerator:
         Returns:
             str: Path to the HTML file
         """
-        if not self.generated_images:
+        if not self.results:
             print("No images to display")
             return None
             
-        # Save images first
-        self.save_all_images()
-            
-        # Create HTML page with images
-        html_content = """
+        # Save images first, unless they already are, and build their thumbnails and previews
+        if not self.image_files:
+            self.save_all_images()
+        derivatives = create_derivatives([image_path for image_path, _ in self.image_files])
+        
+        # Write the HTML page incrementally, one image block at a time
+        with tempfile.NamedTemporaryFile(mode='w', encoding='utf-8', suffix='.html', delete=False) as f:
+            html_path = f.name
+            f.write("""
         <!DOCTYPE html>
         <html>
         <head>
@@ -429,52 +2144,61 @@ class ImageGenerator:
             </style>
         </head>
         <body>
-        """
+            """)
         
-        if provider:
-            html_content += f"""
+            if provider:
+                f.write(f"""
             <h1>Select an Image <span class="provider-badge">Generated with {provider}</span></h1>
-            """
-        else:
-            html_content += """
+                """)
+            else:
+                f.write("""
             <h1>Select an Image</h1>
-            """
+                """)
             
-        html_content += """
+            f.write("""
             <div class="image-container">
-        """
+            """)
         
-        for i, (img_data, prompt) in enumerate(zip(self.generated_images, self.prompts_used)):
-            img_src = f"data:image/png;base64,{img_data}"
+            for i, ((image_path, prompt), image_derivatives) in enumerate(zip(self.image_files, derivatives)):
+                # Let the browser pick the WebP thumbnail or preview that fits the card,
+                # and link both to the full-resolution file
+                full_src = pathlib.Path(image_path).resolve().as_uri()
+                img_attrs = f'src="{full_src}"'
+                if image_derivatives:
+                    srcset = ", ".join(f"{pathlib.Path(path).resolve().as_uri()} {DERIVATIVE_SIZES[name][0]}w"
+                                       for name, path in image_derivatives.items())
+                    img_attrs = (f'src="{pathlib.Path(image_derivatives["preview"]).resolve().as_uri()}" '
+                                 f'srcset="{srcset}" sizes="(max-width: 1200px) 45vw, 540px"')
+                prompt = html.escape(prompt)
             
-            # Create a div for the status message
-            status_div_id = f"status-{i}"
-            transaction_div_id = f"transaction-{i}"
+                # Create a div for the status message
+                status_div_id = f"status-{i}"
+                transaction_div_id = f"transaction-{i}"
             
-            html_content += f"""
+                f.write(f"""
                 <div class="image-option" id="option-{i+1}">
-                    <img src="{img_src}" alt="Generated image {i+1}">
+                    <a href="{full_src}" target="_blank"><img {img_attrs} alt="Generated image {i+1}" loading="lazy"></a>
                     <div class="image-info">
                         <h3>Option {i+1}</h3>
                         <div class="prompt-text">Prompt: {prompt}</div>
                         <div class="button-group">
                             <button class="select-btn" onclick="selectImage({i})">Save Image</button>
-            """
+                """)
             
-            if enable_story_upload:
-                html_content += f"""
+                if enable_story_upload:
+                    f.write(f"""
                             <button class="upload-btn" onclick="uploadToStory({i})">Upload to Story Protocol</button>
-                """
+                    """)
                 
-            html_content += f"""
+                f.write(f"""
                         </div>
                         <div id="{status_div_id}" class="status-message"></div>
                         <div id="{transaction_div_id}" class="transaction-details" style="display: none; word-wrap: break-word; white-space: pre-wrap;"></div>
                     </div>
                 </div>
-            """
+                """)
             
-        html_content += """
+            f.write("""
             </div>
             <script>
                 async function selectImage(index) {
@@ -599,14 +2323,10 @@ class ImageGenerator:
             </script>
         </body>
         </html>
-        """
+            """)
         
-        # Create a temporary HTML file
-        with tempfile.NamedTemporaryFile(suffix='.html', delete=False) as f:
-            f.write(html_content.encode('utf-8'))
-            html_path = f.name
-            
         # Open in browser
+        import webbrowser
         webbrowser.open('file://' + html_path)
         
         print(f"To upload images to Story Protocol, please select the 'Upload to Story Protocol' button in the browser.")
@@ -614,54 +2334,145 @@ class ImageGenerator:
         
         return html_path
     
-    def save_image(self, index=0, filename=None):
+    def save_image(self, index=0, filename=None, image_format=None):
         """
         Save a specific image to disk
         
         Args:
             index (int): Index of the image to save
-            filename (str, optional): Filename to save to. If None, generates one.
+            filename (str, optional): Filename to save to. If None, the image goes
+                into the content-addressed image store.
+            image_format (str, optional): Convert the image to this format. By
+                default the format follows the filename extension, or the
+                provider's format when no filename is given.
             
         Returns:
             str: Path to the saved image
         """
-        if not self.generated_images or index >= len(self.generated_images):
+        if not self.results or index >= len(self.results):
             print("Invalid image index")
             return None
             
-        if filename is None:
-            # Create directory for saved images if it doesn't exist
-            os.makedirs("generated_images", exist_ok=True)
-            # Generate a unique filename based on timestamp and index
-            import time
-            timestamp = int(time.time())
-            filename = f"generated_images/image_{timestamp}_{index}.png"
-            
         try:
-            # Convert base64 to image and save
-            image_data = base64.b64decode(self.generated_images[index])
-            image = Image.open(io.BytesIO(image_data))
-            image.save(filename)
+            result = self.results[index]
+            image_data = result.read()
+            prompt = result.prompt
+            
+            if filename is None:
+                filename = image_store.put(image_data, dict(result.params, prompt=prompt), image_format)["path"]
+            else:
+                write_image_bytes(image_data, filename, image_format)
             print(f"Image saved to {filename}")
             
             # Store the file path and prompt for later use
-            prompt = self.prompts_used[index] if index < len(self.prompts_used) else f"Generated image {index}"
             if not hasattr(self, 'image_files'):
                 self.image_files = []
             self.image_files.append((filename, prompt))
             
             return filename
         except Exception as e:
-            print(f"Error saving image: {e}")
-            return None
+            logger.warning("Error saving image: %s", e)
+            return None
+
+
+def iter_images_from_concept(concept, num_variations=3, provider="together",
+                             max_concurrency=MAX_CONCURRENCY, generator=None, seed=None, same_prompt=False):
+    """
+    Generate images from a simple concept, yielding progress events as each
+    stage completes
+    
+    Every image is saved to the image store as soon as the provider returns it,
+    so the first image is available long before the whole batch is done. Image
+    events arrive in completion order; generator.results and
+    generator.image_files are put back in prompt order before "done".
+    
+    Args:
+        concept (str): Simple concept like "on beach"
+        num_variations (int): Number of image variations to generate
+        provider (str): Image generation provider ("together", "ablo", or "auto"
+            for the provider the router currently ranks best)
+        max_concurrency (int): Maximum number of provider calls in flight at once
+        generator (ImageGenerator, optional): Generator to collect results and
+            saved files on. A new one is created if omitted.
+        seed (int, optional): Fixed Together seed, making the images reproducible
+            and cacheable
+        same_prompt (bool): Expand the concept into one prompt and generate
+            num_variations images of it, in a single Together call where possible
+        
+    Yields:
+        dict: Events with a "type" of "prompts", "image" or "done". Image events
+            carry index, prompt, path, name, provider and timings in seconds.
+    """
+    started = time.time()
+    generator = generator or ImageGenerator()
+    
+    if provider.lower() == "auto":
+        # Whole runs are not hedged; they go to the best provider right now
+        ranked = provider_router.ranked(configured_providers())
+        provider = ranked[0] if ranked else "together"
+        logger.info("Routing to %s", provider)
+    
+    # Determine if we need to include n3lson in prompts based on provider
+    include_nelson = provider.lower() == "together"
+    
+    # For Ablo, we only need 1 prompt since it generates multiple variations per prompt
+    num_prompts = 1 if provider.lower() == "ablo" or same_prompt else num_variations
+    
+    prompts = generate_image_prompts(concept, num_prompts, include_nelson)
+    prompts_seconds = time.time() - started
+    yield {"type": "prompts", "prompts": prompts, "timings": {"prompts": prompts_seconds}}
+    
+    if provider.lower() == "ablo":
+        results = generator.iter_images_with_ablo(prompts, max_concurrency=max_concurrency)
+    else:  # Default to Together
+        if same_prompt:
+            # Repeated prompts are batched into one n=k call
+            prompts = prompts[:1] * num_variations
+        results = generator.iter_images_with_together(prompts, max_concurrency=max_concurrency, seed=seed)
+        
+    generator.results = []
+    generator.image_files = []
+    for result in results:
+        ready = time.time()
+        try:
+            stored = image_store.put(result.read(), dict(result.params, prompt=result.prompt))
+        except Exception as e:
+            logger.warning("Error saving image for prompt '%s': %s", result.prompt, e)
+            continue
+        
+        generator.results.append(result)
+        generator.image_files.append((stored["path"], result.prompt))
+        yield {
+            "type": "image",
+            "index": len(generator.results) - 1,
+            "prompt": result.prompt,
+            "path": stored["path"],
+            "name": stored["name"],
+            "provider": result.params.get("provider", provider),
+            "timings": {
+                "prompts": prompts_seconds,
+                "ready": ready - started,
+                "save": time.time() - ready
+            }
+        }
+        
+    # Images were collected as they finished; hand them to the gallery and the
+    # uploader in prompt order, like the batch path does
+    order = sorted(range(len(generator.results)), key=lambda k: generator.results[k].index)
+    generator.results = [generator.results[k] for k in order]
+    generator.image_files = [generator.image_files[k] for k in order]
+    yield {"type": "done", "count": len(generator.results), "timings": {"total": time.time() - started}}
 
 
-def create_images_from_concept(concept, num_variations=3, provider="together", upload_to_story=False):
+def create_images_from_concept(concept, num_variations=3, provider="together", upload_to_story=False,
+                               max_concurrency=MAX_CONCURRENCY, open_each=False, display=True, seed=None,
+                               same_prompt=False):
     """
     Main function to generate images from a simple concept
     
     1. Convert concept to detailed prompts using LLM
-    2. Generate an image for each prompt using the selected provider
+    2. Generate an image for each prompt using the selected provider,
+       reporting each one as soon as it is saved
     3. Display images for selection
     4. Optionally upload to Story Protocol
     
@@ -670,32 +2481,35 @@ def create_images_from_concept(concept, num_variations=3, provider="together", u
         num_variations (int): Number of image variations to generate
         provider (str): Image generation provider ("together" or "ablo")
         upload_to_story (bool): Whether to automatically upload all images to Story Protocol
+        max_concurrency (int): Maximum number of provider calls in flight at once
+        open_each (bool): Whether to open every image in the browser as soon as it is ready
+        display (bool): Whether to open the selection gallery at the end
+        seed (int, optional): Fixed Together seed, making the images reproducible
+            and cacheable
+        same_prompt (bool): Generate num_variations images of one expanded
+            prompt, in a single Together call where possible
         
     Returns:
-        tuple: (list of generated images, list of prompts used)
+        tuple: (list of GeneratedImage records, list of prompts used)
     """
-    # Determine if we need to include n3lson in prompts based on provider
-    include_nelson = provider.lower() == "together"
-    
-    # For Ablo, we only need 1 prompt since it generates multiple variations per prompt
-    num_prompts = 1 if provider.lower() == "ablo" else num_variations
-    
-    # Step 1: Generate detailed prompts from the concept
-    prompts = generate_image_prompts(concept, num_prompts, include_nelson)
-    
-    # Step 2: Generate images from the prompts using the selected provider
     try:
         generator = ImageGenerator()
         
-        if provider.lower() == "ablo":
-            images = generator.generate_images_with_ablo(prompts)
-        else:  # Default to Together
-            images = generator.generate_images_with_together(prompts)
-        
-        # Step 3: Save all generated images
+        # Steps 1-3: Generate prompts, then generate and save each image as it completes
+        for event in iter_images_from_concept(concept, num_variations, provider, max_concurrency, generator, seed,
+                                              same_prompt):
+            if event["type"] == "image":
+                timings = event["timings"]
+                print(f"[{timings['ready']:.1f}s] Image {event['index']+1} ready: {event['path']}")
+                print(f"  Prompt: {event['prompt']}")
+                if open_each:
+                    import webbrowser
+                    webbrowser.open(pathlib.Path(event["path"]).resolve().as_uri())
+            elif event["type"] == "done":
+                print(f"Generated {event['count']} images in {event['timings']['total']:.1f}s")
+                
+        images = generator.results
         if images:
-            generator.save_all_images()
-            
             # Step 4: Upload to Story Protocol if requested
             if upload_to_story:
                 print("")
@@ -722,7 +2536,8 @@ def create_images_from_concept(concept, num_variations=3, provider="together", u
                         print("")
             
             # Step 5: Display images for selection
-            generator.display_images_for_selection(provider, enable_story_upload=True)
+            if display:
+                generator.display_images_for_selection(provider, enable_story_upload=True)
             
             return images, generator.prompts_used
         else:
@@ -734,72 +2549,924 @@ def create_images_from_concept(concept, num_variations=3, provider="together", u
         return [], []
 
 
+class GenerationError(Exception):
+    """Raised when the single-image pipeline cannot produce an image"""
+
+
+# Image providers in their default order of preference
+IMAGE_PROVIDERS = ("together", "ablo")
+
+
+def configured_providers():
+    """Return the image providers whose API keys are set"""
+    keys = {"together": "TOGETHER_API_KEY", "ablo": "ABLO_KEY"}
+    return [name for name in IMAGE_PROVIDERS if os.environ.get(keys[name])]
+
+
+class ProviderRouter:
+    """
+    Latency-aware routing across image providers with hedged requests
+    
+    Keeps a rolling window of latencies and outcomes per provider. Each
+    request goes to the healthy provider with the lowest median latency. If it
+    has not answered by that provider's p95 latency, the same request is also
+    sent to the next provider, and whichever succeeds first wins. A loser that
+    has not started is cancelled; one already running finishes in the
+    background and its result is discarded.
+    """
+    
+    def __init__(self, window=None, max_error_rate=None, hedge_delay=None, min_samples=5):
+        self.window = window or int(os.environ.get("ROUTER_WINDOW", "50"))
+        self.max_error_rate = max_error_rate if max_error_rate is not None else float(os.environ.get("ROUTER_MAX_ERROR_RATE", "0.5"))
+        # Used until a provider has min_samples successful calls to take a p95 from
+        self.hedge_delay = hedge_delay if hedge_delay is not None else float(os.environ.get("ROUTER_HEDGE_DELAY", "20"))
+        self.min_samples = min_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=int(os.environ.get("ROUTER_WORKERS", "16")),
+                                            thread_name_prefix="router")
+        
+    def record(self, provider, seconds, ok):
+        """Add one call's latency and outcome to the provider's rolling window"""
+        with self._lock:
+            samples = self._samples.get(provider)
+            if samples is None:
+                samples = self._samples[provider] = deque(maxlen=self.window)
+            samples.append((seconds, ok))
+            
+    def stats(self, provider):
+        """
+        Summarize the provider's rolling window
+        
+        Returns:
+            dict: samples, errorRate, and p50/p95 latency of successful calls
+                (None until there is one)
+        """
+        with self._lock:
+            samples = list(self._samples.get(provider, ()))
+        latencies = sorted(seconds for seconds, ok in samples if ok)
+        errors = sum(1 for _, ok in samples if not ok)
+        
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return latencies[min(int(fraction * len(latencies)), len(latencies) - 1)]
+        
+        return {
+            "samples": len(samples),
+            "errorRate": errors / len(samples) if samples else 0.0,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95)
+        }
+    
+    def ranked(self, providers):
+        """
+        Order providers best first
+        
+        Healthy providers come before ones whose error rate is above
+        max_error_rate, then lower median latency wins. Providers that were
+        never called rank first so they get measured.
+        """
+        def score(provider):
+            stats = self.stats(provider)
+            unhealthy = stats["samples"] >= self.min_samples and stats["errorRate"] > self.max_error_rate
+            if stats["p50"] is not None:
+                return (unhealthy, stats["p50"])
+            # Never measured: try it first. Only failures so far: try it last.
+            return (unhealthy, float("inf") if stats["samples"] else 0.0)
+        return sorted(providers, key=score)
+    
+    def _delay_before_hedge(self, provider):
+        stats = self.stats(provider)
+        if stats["p95"] is not None and stats["samples"] >= self.min_samples:
+            return stats["p95"]
+        return self.hedge_delay
+    
+    def call(self, func, provider):
+        """Call func(provider) and record its latency and outcome"""
+        started = time.perf_counter()
+        try:
+            result = func(provider)
+        except Exception:
+            self.record(provider, time.perf_counter() - started, False)
+            raise
+        self.record(provider, time.perf_counter() - started, True)
+        return result
+    
+    def run(self, func, providers):
+        """
+        Call func(provider) on the best provider, hedging with the next one
+        
+        Args:
+            func (callable): Does the work for one provider; raises on failure
+            providers (list): Candidate providers
+            
+        Returns:
+            tuple: (result, name of the provider that served it)
+            
+        Raises:
+            GenerationError: If no provider is available
+            Exception: The last provider error if every provider fails
+        """
+        remaining = self.ranked(providers)
+        if not remaining:
+            raise GenerationError("No image provider is configured")
+        
+        pending = {}
+        
+        def launch():
+            provider = remaining.pop(0)
+            future = self._executor.submit(contextvars.copy_context().run, self.call, func, provider)
+            pending[future] = provider
+            return time.monotonic() + self._delay_before_hedge(provider)
+        
+        deadline = launch()
+        last_error = None
+        while pending:
+            timeout = max(deadline - time.monotonic(), 0) if remaining else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # The request is past the provider's p95: hedge with the next one
+                metrics.inc("story_router_hedges_total", provider=remaining[0])
+                logger.info("%s slower than p95, hedging with %s", ", ".join(pending.values()), remaining[0])
+                deadline = launch()
+                continue
+            
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    logger.warning("Provider %s failed: %s", provider, e)
+                    # Fail over right away rather than waiting for the hedge deadline
+                    if not pending and remaining:
+                        deadline = launch()
+                    continue
+                
+                for loser in pending:
+                    loser.cancel()
+                metrics.inc("story_router_requests_total", provider=provider)
+                return result, provider
+            
+        raise last_error
+
+
+# Shared router for provider="auto"
+provider_router = ProviderRouter()
+
+
+def generate_single_image(prompt, provider="together", seed=None):
+    """
+    Run the full pipeline for one image: prompt expansion, generation and save
+    
+    Concurrent calls with the same normalized prompt and provider share one
+    run, and each caller gets its own copy of the result.
+    
+    Args:
+        prompt (str): Simple concept from the client
+        provider (str): Image generation provider ("together", "ablo" or "auto")
+        seed (int, optional): Fixed Together seed, making the image reproducible
+            and cacheable
+        
+    Returns:
+        dict: imageName, prompt, generatedAt and provider of the saved image
+        
+    Raises:
+        GenerationError: If any stage of the pipeline fails
+    """
+    # Identical requests in flight at the same time share one pipeline run
+    key = ("image", normalize_prompt(prompt), provider.lower(), seed)
+    return dict(single_flight.do(key, _generate_single_image, prompt, provider, seed))
+
+
+def _generate_single_image(prompt, provider, seed):
+    # Determine if we need to add n3lson prefix based on provider. Ablo strips it,
+    # so routed requests keep it in case Together serves them.
+    include_nelson = provider.lower() in ("together", "auto")
+    
+    # Generate detailed prompts from the concept
+    prompts = generate_image_prompts(prompt, 1, include_nelson)
+    if not prompts:
+        raise GenerationError("Failed to generate prompts")
+    
+    # Use the first generated prompt to create an image
+    return generate_image_from_prompt(prompts[0], provider, seed=seed)
+
+
+def generate_image_from_prompt(detailed_prompt, provider="together", width=1024, height=768, seed=None):
+    """
+    Generate and save one image for an already expanded prompt
+    
+    Args:
+        detailed_prompt (str): Prompt to send to the provider as is
+        provider (str): Image generation provider ("together", "ablo" or "auto"
+            to let provider_router pick and hedge)
+        width (int): Image width (Together only)
+        height (int): Image height (Together only)
+        seed (int, optional): Fixed seed (Together only)
+        
+    Returns:
+        dict: imageName, prompt, generatedAt and provider of the saved image.
+            provider is the one that actually served the image.
+        
+    Raises:
+        GenerationError: If generation or saving fails
+    """
+    key = ("image_from_prompt", detailed_prompt, provider.lower(), width, height, seed)
+    return dict(single_flight.do(key, _generate_image_from_prompt, detailed_prompt, provider, width, height, seed))
+
+
+def _generate_image_from_prompt(detailed_prompt, provider, width, height, seed):
+    def generate_with(name):
+        generator = ImageGenerator()
+        if name == "ablo":
+            images = generator.generate_images_with_ablo([detailed_prompt])
+        else:  # Default to Together
+            images = generator.generate_images_with_together([detailed_prompt], width=width, height=height, seed=seed)
+        if not images:
+            if isinstance(generator.last_error, ProviderUnavailableError):
+                raise generator.last_error
+            raise GenerationError("Failed to generate image")
+        return generator
+    
+    if provider.lower() == "auto":
+        # Fastest healthy provider, hedged with the next one once it passes its p95
+        generator, provider = provider_router.run(generate_with, configured_providers())
+    else:
+        generator = provider_router.call(generate_with, provider.lower())
+    
+    # Save the image
+    filepath = generator.save_image(0)
+    if not filepath:
+        raise GenerationError("Failed to save image")
+    
+    return {
+        'imageName': os.path.basename(filepath),
+        'prompt': detailed_prompt,
+        'generatedAt': int(time.time()),
+        'provider': provider
+    }
+
+
+# Largest number of items accepted by /api/generate-batch
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "100"))
+
+# Largest number of variations accepted by /api/generate-stream
+STREAM_MAX_VARIATIONS = int(os.environ.get("STREAM_MAX_VARIATIONS", "10"))
+
+# Smallest and largest image width or height accepted by /api/generate-batch
+IMAGE_MIN_SIDE = 64
+IMAGE_MAX_SIDE = int(os.environ.get("IMAGE_MAX_SIDE", "2048"))
+
+
+def batch_item_key(item):
+    """Normalized identity of a batch item: items with the same key are generated once"""
+    return (normalize_prompt(item["prompt"]), item["provider"], item["width"], item["height"], item.get("seed"))
+
+
+def parse_seed(value):
+    """
+    Validate an optional seed from a request body
+    
+    Returns:
+        int: The seed, or None if value is None
+        
+    Raises:
+        ValueError: If value is not an integer
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError("seed must be an integer")
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError("seed must be an integer")
+
+
+def generate_batch(items, max_concurrency=MAX_CONCURRENCY):
+    """
+    Generate one image per batch item, generating identical items only once
+    
+    Prompts are expanded with one LLM call per prompt style (with and without
+    n3lson), then the generations share a single concurrency budget.
+    
+    Args:
+        items (list): Dicts with prompt, provider, width, height and optional seed
+        max_concurrency (int): Maximum number of generations in flight across the batch
+        
+    Returns:
+        list: One dict per item, in order, with either "result" (as returned by
+            generate_image_from_prompt) or "error"
+    """
+    unique = {}
+    for item in items:
+        unique.setdefault(batch_item_key(item), item)
+    keys = list(unique)
+    logger.info("Batch of %d items, %d unique", len(items), len(keys))
+    
+    expanded = {}
+    for include_nelson in (True, False):
+        group = [key for key in keys if (unique[key]["provider"] != "ablo") == include_nelson]
+        if group:
+            prompts = generate_image_prompts_batch([unique[key]["prompt"] for key in group], include_nelson)
+            expanded.update(zip(group, prompts))
+            
+    def generate_one(i, key):
+        item = unique[key]
+        try:
+            return {"result": generate_image_from_prompt(expanded[key], item["provider"],
+                                                         item["width"], item["height"], item.get("seed"))}
+        except Exception as e:
+            logger.warning("Error generating batch item '%s': %s", item["prompt"], e)
+            return {"error": str(e)}
+        
+    outcomes = dict(zip(keys, run_bounded(generate_one, keys, max_concurrency)))
+    return [outcomes[batch_item_key(item)] for item in items]
+
+
+class JobManager:
+    """
+    Bounded worker pool for background image generation jobs, with job state in SQLite
+    
+    Each job moves through queued -> running -> succeeded/failed. Every state
+    change bumps the job's version. The state lives in a SQLite database, so
+    every server worker process can answer status and event requests for a job
+    that another worker is running. Waiters in the running process are woken
+    immediately; waiters elsewhere poll the database.
+    """
+    
+    TERMINAL_STATES = ("succeeded", "failed")
+    POLL_INTERVAL = 0.5
+    
+    def __init__(self, max_workers=None, ttl=None, path=None):
+        self.max_workers = max_workers or int(os.environ.get("JOB_WORKERS", "8"))
+        self.ttl = ttl if ttl is not None else int(os.environ.get("JOB_TTL", "3600"))
+        self.path = path or os.environ.get("JOB_STORE_PATH", os.path.join(".cache", "jobs.sqlite"))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        self._condition = threading.Condition()
+        self._lock = threading.Lock()
+        self._initialized = False
+        
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, status TEXT NOT NULL, result TEXT, error TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, version INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_updated_at ON jobs (updated_at)")
+            self._initialized = True
+        return conn
+    
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue func(*args, **kwargs) on the worker pool
+        
+        Returns:
+            str: Job id
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                placeholders = ", ".join("?" * len(self.TERMINAL_STATES))
+                conn.execute(f"DELETE FROM jobs WHERE status IN ({placeholders}) AND updated_at < ?",
+                             (*self.TERMINAL_STATES, now - self.ttl))
+                conn.execute(
+                    "INSERT INTO jobs (job_id, status, created_at, updated_at, version) VALUES (?, 'queued', ?, ?, 0)",
+                    (job_id, now, now)
+                )
+            conn.close()
+        # The job keeps the trace id of the request that queued it
+        self._executor.submit(contextvars.copy_context().run, self._run, job_id, func, args, kwargs)
+        return job_id
+    
+    def _run(self, job_id, func, args, kwargs):
+        self._update(job_id, status='running')
+        try:
+            result = func(*args, **kwargs)
+            self._update(job_id, status='succeeded', result=result)
+        except Exception as e:
+            logger.warning("Error in job %s: %s", job_id, e)
+            self._update(job_id, status='failed', error=str(e))
+            
+    def _update(self, job_id, status, result=None, error=None):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, version = version + 1 "
+                    "WHERE job_id = ?",
+                    (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+                )
+            conn.close()
+        with self._condition:
+            self._condition.notify_all()
+    
+    def get(self, job_id):
+        """Return a snapshot of the job, or None if it is unknown"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT status, result, error, created_at, updated_at, version FROM jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+            conn.close()
+        if row is None:
+            return None
+        return {
+            'jobId': job_id,
+            'status': row[0],
+            'result': json.loads(row[1]) if row[1] else None,
+            'error': row[2],
+            'createdAt': row[3],
+            'updatedAt': row[4],
+            'version': row[5]
+        }
+    
+    def wait_for_change(self, job_id, version, timeout=15):
+        """
+        Block until the job's version moves past version or timeout expires
+        
+        Returns:
+            dict: Latest job snapshot, or None if the job is unknown
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['version'] > version or remaining <= 0:
+                return job
+            with self._condition:
+                self._condition.wait(min(remaining, self.POLL_INTERVAL))
+
+
+# Shared worker pool for /api/jobs
+job_manager = JobManager()
+
+
+def job_to_response(job, host):
+    """Build the public JSON view of a job for the given request host"""
+    response = {
+        'jobId': job['jobId'],
+        'status': job['status'],
+        'createdAt': job['createdAt'],
+        'updatedAt': job['updatedAt']
+    }
+    if job['result']:
+        result = dict(job['result'])
+        result['imageUrl'] = f"http://{host}/api/images/{result.pop('imageName')}"
+        response['result'] = result
+    if job['error']:
+        response['error'] = job['error']
+    return response
+
+
+# Generated files never change once written, so clients may cache them for a year
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class ImageMemoryCache:
+    """
+    In-memory LRU of hot image files with a total size limit
+    
+    Disabled when max_bytes is 0. Entries hold the file bytes and their
+    content-hash ETag.
+    """
+    
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.environ.get("IMAGE_MEMORY_CACHE_BYTES", "0"))
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        
+    def get(self, path):
+        """Return (data, etag) for a cached path, or None"""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                self._entries.move_to_end(path)
+            return entry
+    
+    def put(self, path, data, etag):
+        """Cache a file's bytes, evicting the least recently used entries to fit"""
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if path in self._entries:
+                return
+            self._entries[path] = (data, etag)
+            self.current_bytes += len(data)
+            while self.current_bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+
+# Shared cache of hot images. Set IMAGE_MEMORY_CACHE_BYTES to enable it.
+image_memory_cache = ImageMemoryCache()
+
+# Content hashes of legacy files, keyed by (path, mtime, size). Bounded LRU
+# shared by the request threads.
+LEGACY_ETAG_CACHE_SIZE = 1024
+_legacy_etags = OrderedDict()
+_legacy_etags_lock = threading.Lock()
+
+
+def image_etag(path, image_name):
+    """
+    Return the content-hash ETag of an image file
+    
+    Content-addressed names already are the hash. Legacy files are hashed once
+    and remembered until they change on disk.
+    """
+    stem = os.path.splitext(image_name)[0]
+    if len(stem) == 64 and all(c in "0123456789abcdef" for c in stem):
+        return stem
+    
+    stat = os.stat(path)
+    key = (path, stat.st_mtime, stat.st_size)
+    with _legacy_etags_lock:
+        etag = _legacy_etags.get(key)
+        if etag is not None:
+            _legacy_etags.move_to_end(key)
+            return etag
+    
+    with open(path, "rb") as f:
+        etag = hashlib.sha256(f.read()).hexdigest()
+    with _legacy_etags_lock:
+        _legacy_etags[key] = etag
+        while len(_legacy_etags) > LEGACY_ETAG_CACHE_SIZE:
+            _legacy_etags.popitem(last=False)
+    return etag
+
+
 # API Endpoints
-@app.route('/api/generate-image', methods=['POST'])
+@request_hook('before_request')
+def start_request_trace():
+    """Give every request a trace id, taken from X-Request-ID when the client sends one"""
+    from flask import g, request
+    
+    g.trace_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+    trace_id_var.set(g.trace_id)
+    g.request_started = time.perf_counter()
+    metrics.inc("story_http_requests_in_flight", 1)
+    g.in_flight = True
+
+@request_hook('after_request')
+def finish_request_trace(response):
+    """Echo the trace id back and record the request's status and duration"""
+    from flask import g, request
+    
+    trace_id = g.get('trace_id')
+    if trace_id:
+        response.headers['X-Request-ID'] = trace_id
+    started = g.get('request_started')
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        duration = time.perf_counter() - started
+        metrics.inc("story_http_requests_total", endpoint=endpoint, method=request.method,
+                    status=response.status_code)
+        metrics.observe("story_http_request_duration_seconds", duration, endpoint=endpoint,
+                        method=request.method)
+        logger.info("%s %s -> %d in %.1f ms", request.method, request.path, response.status_code, duration * 1000)
+    return response
+
+@request_hook('teardown_request')
+def end_request_trace(error=None):
+    """Drop the request from the in-flight gauge, even if it failed"""
+    from flask import g
+    
+    if g.pop('in_flight', False):
+        metrics.inc("story_http_requests_in_flight", -1)
+
+@route('/api/generate-image', methods=['POST'])
 def api_generate_image():
     """API endpoint to generate an image based on a prompt"""
+    from flask import request, jsonify
+    
     data = request.json
     if not data or 'prompt' not in data:
         return jsonify({'error': 'Prompt is required'}), 400
     
     prompt = data['prompt']
     provider = data.get('provider', 'together')
+    try:
+        seed = parse_seed(data.get('seed'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     try:
-        print(f"API received prompt: '{prompt}' with provider '{provider}'")
-        
-        # Create generator instance
-        generator = ImageGenerator()
-        
-        # Determine if we need to add n3lson prefix based on provider
-        include_nelson = provider.lower() == "together"
-        
-        # Generate detailed prompts from the concept
-        prompts = generate_image_prompts(prompt, 1, include_nelson)
-        if not prompts:
-            return jsonify({'error': 'Failed to generate prompts'}), 500
-        
-        # Use the first generated prompt to create an image
-        if provider.lower() == "ablo":
-            images = generator.generate_images_with_ablo(prompts)
-        else:  # Default to Together
-            images = generator.generate_images_with_together(prompts)
-        
-        if not images:
-            return jsonify({'error': 'Failed to generate image'}), 500
+        logger.info("API received prompt: '%s' with provider '%s'", prompt, provider)
         
-        # Save the image
-        filepath = generator.save_image(0)
-        if not filepath:
-            return jsonify({'error': 'Failed to save image'}), 500
+        result = generate_single_image(prompt, provider, seed)
         
         # Get the full image URL for the frontend including host and port
-        image_name = os.path.basename(filepath)
-        image_url = f"http://{request.host}/api/images/{image_name}"
+        image_url = f"http://{request.host}/api/images/{result['imageName']}"
         
         # Return response
         return jsonify({
             'imageUrl': image_url,
-            'prompt': prompts[0],
-            'generatedAt': int(os.path.basename(filepath).split('_')[1]),
-            'provider': provider
+            'prompt': result['prompt'],
+            'generatedAt': result['generatedAt'],
+            'provider': result['provider']
         })
         
+    except ProviderUnavailableError as e:
+        # Tell the client when the provider is expected to accept calls again
+        retry_after = max(int(e.retry_after or 0), 1)
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(retry_after)}
+    except GenerationError as e:
+        return jsonify({'error': str(e)}), 500
     except Exception as e:
-        print(f"Error generating image via API: {e}")
+        logger.warning("Error generating image via API: %s", e)
         return jsonify({'error': f'Error: {str(e)}'}), 500
 
-@app.route('/api/images/<image_name>', methods=['GET'])
+@route('/api/generate-batch', methods=['POST'])
+def api_generate_batch():
+    """
+    Generate images for many concepts in one request
+    
+    Each item is a concept string or an object with prompt and optional
+    provider, width, height and seed. Identical items are generated once, and every
+    item gets its own result or error.
+    """
+    from flask import request, jsonify
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    raw_items = data.get('items')
+    if not isinstance(raw_items, list) or not raw_items:
+        return jsonify({'error': 'items must be a non-empty list'}), 400
+    if len(raw_items) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'At most {BATCH_MAX_ITEMS} items are allowed per batch'}), 400
+    
+    items = []
+    for i, raw_item in enumerate(raw_items):
+        if isinstance(raw_item, str):
+            raw_item = {'prompt': raw_item}
+        if not isinstance(raw_item, dict) or not str(raw_item.get('prompt', '')).strip():
+            return jsonify({'error': f'Item {i} needs a prompt'}), 400
+        provider = str(raw_item.get('provider', data.get('provider', 'together'))).lower()
+        if provider not in ('together', 'ablo', 'auto'):
+            return jsonify({'error': f'Item {i} has an unknown provider: {provider}'}), 400
+        try:
+            width = int(raw_item.get('width', 1024))
+            height = int(raw_item.get('height', 768))
+        except (TypeError, ValueError):
+            return jsonify({'error': f'Item {i} has an invalid size'}), 400
+        if not (IMAGE_MIN_SIDE <= width <= IMAGE_MAX_SIDE and IMAGE_MIN_SIDE <= height <= IMAGE_MAX_SIDE):
+            return jsonify({'error': f'Item {i}: width and height must be between {IMAGE_MIN_SIDE} '
+                                     f'and {IMAGE_MAX_SIDE}'}), 400
+        try:
+            seed = parse_seed(raw_item.get('seed', data.get('seed')))
+        except ValueError as e:
+            return jsonify({'error': f'Item {i}: {e}'}), 400
+        items.append({'prompt': str(raw_item['prompt']), 'provider': provider, 'width': width, 'height': height,
+                      'seed': seed})
+        
+    logger.info("API received batch of %d items", len(items))
+    results = []
+    for i, outcome in enumerate(generate_batch(items)):
+        if 'result' in outcome:
+            result = outcome['result']
+            results.append({
+                'index': i,
+                'status': 'succeeded',
+                'imageUrl': f"http://{request.host}/api/images/{result['imageName']}",
+                'prompt': result['prompt'],
+                'generatedAt': result['generatedAt'],
+                'provider': result['provider']
+            })
+        else:
+            results.append({'index': i, 'status': 'failed', 'error': outcome['error']})
+            
+    succeeded = sum(1 for result in results if result['status'] == 'succeeded')
+    return jsonify({
+        'results': results,
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'unique': len({batch_item_key(item) for item in items})
+    })
+
+@route('/api/jobs', methods=['POST'])
+def api_submit_job():
+    """Queue an image generation job and return its id immediately"""
+    from flask import request, jsonify
+    
+    data = request.json
+    if not data or 'prompt' not in data:
+        return jsonify({'error': 'Prompt is required'}), 400
+    
+    prompt = data['prompt']
+    provider = data.get('provider', 'together')
+    try:
+        seed = parse_seed(data.get('seed'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    logger.info("API queued prompt: '%s' with provider '%s'", prompt, provider)
+    
+    job_id = job_manager.submit(generate_single_image, prompt, provider, seed)
+    return jsonify({
+        'jobId': job_id,
+        'status': 'queued',
+        'statusUrl': f"http://{request.host}/api/jobs/{job_id}",
+        'eventsUrl': f"http://{request.host}/api/jobs/{job_id}/events"
+    }), 202
+
+@route('/api/jobs/<job_id>', methods=['GET'])
+def api_job_status(job_id):
+    """Poll the status of a queued image generation job"""
+    from flask import request, jsonify
+    
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_to_response(job, request.host))
+
+@route('/api/jobs/<job_id>/events', methods=['GET'])
+def api_job_events(job_id):
+    """Stream status changes of a job as Server-Sent Events until it finishes"""
+    from flask import Response, request, jsonify
+    
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    host = request.host
+    
+    def event_stream(job):
+        version = -1
+        while job:
+            if job['version'] != version:
+                version = job['version']
+                yield f"event: {job['status']}\ndata: {json.dumps(job_to_response(job, host))}\n\n"
+                if job['status'] in JobManager.TERMINAL_STATES:
+                    return
+            else:
+                # Keep proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+            job = job_manager.wait_for_change(job_id, version)
+            
+    return Response(event_stream(job), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@route('/api/generate-stream', methods=['POST'])
+def api_generate_stream():
+    """
+    Generate several images from a concept and stream each one as soon as it is ready
+    
+    Events are sent as NDJSON by default, or as Server-Sent Events when the
+    client asks for text/event-stream or sends "format": "sse".
+    """
+    from flask import Response, request, jsonify
+    
+    data = request.json
+    if not data or 'prompt' not in data:
+        return jsonify({'error': 'Prompt is required'}), 400
+    
+    prompt = data['prompt']
+    provider = data.get('provider', 'together')
+    try:
+        variations = int(data.get('variations', 1))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'variations must be an integer'}), 400
+    if not 1 <= variations <= STREAM_MAX_VARIATIONS:
+        return jsonify({'error': f'variations must be between 1 and {STREAM_MAX_VARIATIONS}'}), 400
+    try:
+        seed = parse_seed(data.get('seed'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    use_sse = data.get('format') == 'sse' or 'text/event-stream' in request.headers.get('Accept', '')
+    host = request.host
+    logger.info("API streaming %d images for prompt '%s' with provider '%s'", variations, prompt, provider)
+    
+    same_prompt = bool(data.get('samePrompt'))
+    
+    def event_stream():
+        try:
+            # Identical streams already running are joined; every client gets all events
+            key = ("stream", normalize_prompt(prompt), provider.lower(), variations, seed, same_prompt)
+            for event in single_flight.stream(key, iter_images_from_concept, prompt, variations, provider,
+                                              seed=seed, same_prompt=same_prompt):
+                if event['type'] == 'image':
+                    image_event = {key: value for key, value in event.items() if key not in ('name', 'path')}
+                    image_event['imageUrl'] = f"http://{host}/api/images/{event['name']}"
+                    image_event['generatedAt'] = int(time.time())
+                    event = image_event
+                yield event
+        except Exception as e:
+            logger.warning("Error streaming images via API: %s", e)
+            yield {'type': 'error', 'error': f'Error: {str(e)}'}
+            
+    if use_sse:
+        body = (f"event: {event['type']}\ndata: {json.dumps(event)}\n\n" for event in event_stream())
+        return Response(body, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    body = (json.dumps(event) + "\n" for event in event_stream())
+    return Response(body, mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@route('/api/images/<image_name>', methods=['GET'])
 def get_image(image_name):
-    """Serve generated images"""
-    return send_from_directory('generated_images', image_name)
+    """
+    Serve generated images
+    
+    Responses carry a strong content-hash ETag and immutable caching headers,
+    and honour If-None-Match (304) and Range (206) requests.
+    """
+    from flask import Response, request, jsonify, send_file
+    from werkzeug.security import safe_join
+    
+    path = image_store.lookup(image_name)
+    if not path and format_from_filename(image_name):
+        # Images saved before the content-addressed store live directly in the image root.
+        # Only image files are served from there, never catalogs or partial writes.
+        path = safe_join(image_store.root, image_name)
+    if not path or not os.path.isfile(path):
+        return jsonify({'error': 'Image not found'}), 404
+    
+    mimetype = mimetypes.guess_type(image_name)[0] or 'application/octet-stream'
+    
+    cached = image_memory_cache.get(path) if image_memory_cache.max_bytes else None
+    if cached is None and image_memory_cache.max_bytes and os.path.getsize(path) <= image_memory_cache.max_bytes:
+        with open(path, "rb") as f:
+            data = f.read()
+        cached = (data, image_etag(path, image_name))
+        image_memory_cache.put(path, *cached)
+        
+    if cached is not None:
+        data, etag = cached
+        response = Response(data, mimetype=mimetype)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = IMAGE_CACHE_CONTROL
+        return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+    
+    response = send_file(os.path.abspath(path), mimetype=mimetype, conditional=True,
+                         etag=image_etag(path, image_name))
+    response.headers['Cache-Control'] = IMAGE_CACHE_CONTROL
+    return response
+
+@route('/metrics', methods=['GET'])
+def api_metrics():
+    """Expose stage timings, provider errors and in-flight gauges in the Prometheus text format"""
+    from flask import Response
+    
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 # Run the Flask app when called with --serve flag
 def run_flask_server(host='0.0.0.0', port=5001):
     """Run the Flask server"""
     print(f"Starting API server at http://{host}:{port}")
     print(f"API endpoint available at http://{host}:{port}/api/generate-image")
-    app.run(host=host, port=port, debug=True)
+    get_app().run(host=host, port=port, debug=True)
+
+def run_production_server(host='0.0.0.0', port=5001, workers=None, worker_connections=1000,
+                          graceful_timeout=30, timeout=120):
+    """
+    Replace this process with a gunicorn server running gevent workers
+    
+    gevent patches sockets, subprocesses and threads before a worker imports
+    this module, so the blocking requests and Together SDK calls yield to other
+    requests while they wait on the network. A single worker can keep hundreds
+    of slow generation calls open at once.
+    
+    Args:
+        host (str): Interface to bind
+        port (int): Port to bind
+        workers (int, optional): Worker processes. Defaults to the CPU count.
+        worker_connections (int): Concurrent requests each worker accepts
+        graceful_timeout (int): Seconds in-flight requests get to finish on shutdown
+        timeout (int): Seconds before an unresponsive worker is restarted
+    """
+    missing = [name for name in ("gunicorn", "gevent") if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"Error: production mode requires {' and '.join(missing)}. Install with: pip3 install gunicorn gevent")
+        return 1
+    
+    workers = workers or os.cpu_count() or 1
+    command = [
+        sys.executable, "-m", "gunicorn",
+        "--worker-class", "gevent",
+        "--workers", str(workers),
+        "--worker-connections", str(worker_connections),
+        "--graceful-timeout", str(graceful_timeout),
+        "--timeout", str(timeout),
+        "--bind", f"{host}:{port}",
+        "--chdir", os.path.dirname(os.path.abspath(__file__)),
+        "--access-logfile", "-",
+        "app:app"
+    ]
+    print(f"Starting production API server at http://{host}:{port} "
+          f"({workers} gevent workers x {worker_connections} connections)")
+    sys.stdout.flush()
+    # The workers must import the app after gevent has patched the standard library
+    os.execv(sys.executable, command)
 
 def main():
     """
@@ -808,24 +3475,47 @@ def main():
     # Set up argument parser
     parser = argparse.ArgumentParser(description="Generate images from a simple concept using AI")
     parser.add_argument("concept", nargs="*", help="Concept to generate images for (e.g., 'on beach')")
-    parser.add_argument("--provider", "-p", choices=["together", "ablo"], default="together", 
-                       help="Image generation provider to use (together or ablo)")
+    parser.add_argument("--provider", "-p", choices=["together", "ablo", "auto"], default="together", 
+                       help="Image generation provider to use (together, ablo, or auto for any configured one)")
     parser.add_argument("--variations", "-n", type=int, default=3,
                        help="Number of image variations to generate")
+    parser.add_argument("--concurrency", "-c", type=int, default=MAX_CONCURRENCY,
+                       help=f"Maximum number of provider calls in flight at once (default: {MAX_CONCURRENCY})")
+    parser.add_argument("--seed", type=int, default=None,
+                       help="Fixed Together seed for reproducible images (cached when IMAGE_RESULT_CACHE=1)")
+    parser.add_argument("--same-prompt", action="store_true",
+                       help="Generate every variation from one expanded prompt in a single Together call")
+    parser.add_argument("--open-each", action="store_true",
+                       help="Open every image in the browser as soon as it is ready")
     parser.add_argument("--upload", "-u", action="store_true",
                        help="Automatically upload all generated images to Story Protocol")
     parser.add_argument("--serve", "-s", action="store_true",
                        help="Start the API server")
     parser.add_argument("--port", type=int, default=5001,
                        help="Port to run the API server on (default: 5001)")
+    parser.add_argument("--production", action="store_true",
+                       help="With --serve, run under gunicorn with gevent workers instead of the development server")
+    parser.add_argument("--workers", type=int, default=None,
+                       help="Production worker processes (default: CPU count)")
+    parser.add_argument("--worker-connections", type=int, default=1000,
+                       help="Concurrent requests per production worker (default: 1000)")
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                       help="Seconds in-flight requests get to finish on shutdown (default: 30)")
     
     # Parse arguments
     args = parser.parse_args()
     
     # If --serve flag is provided, start the Flask server
     if args.serve:
+        if args.production:
+            return run_production_server(port=args.port, workers=args.workers,
+                                         worker_connections=args.worker_connections,
+                                         graceful_timeout=args.graceful_timeout)
         return run_flask_server(port=args.port)
     
+    # One trace id for the whole CLI run
+    trace_id_var.set(uuid.uuid4().hex[:16])
+    
     # Get concept from arguments or use default
     user_concept = " ".join(args.concept) if args.concept else "on beach with sunglasses"
     
@@ -838,6 +3528,9 @@ def main():
         print("Error: ABLO_KEY not found in environment variables.")
         print("Please add it to your .env file in the format: ABLO_KEY=your_api_key_here")
         sys.exit(1)
+    elif args.provider.lower() == "auto" and not configured_providers():
+        print("Error: neither TOGETHER_API_KEY nor ABLO_KEY found in environment variables.")
+        sys.exit(1)
         
     # If uploading to Story Protocol, verify those API keys
     if args.upload:
@@ -851,7 +3544,9 @@ def main():
         print("Images will be automatically uploaded to Story Protocol")
     
     # Generate images from concept
-    images, prompts = create_images_from_concept(user_concept, args.variations, args.provider, args.upload)
+    images, prompts = create_images_from_concept(user_concept, args.variations, args.provider, args.upload,
+                                                max_concurrency=args.concurrency, open_each=args.open_each,
+                                                seed=args.seed, same_prompt=args.same_prompt)
     
     print(f"Generated {len(images)} images")
     
@@ -0,0 +1,284 @@
+"""
+Local stand-ins for the Nillion, Together, Ablo and Pinata APIs
+
+Each mock speaks just enough of the real provider's HTTP API for app.py to run
+against it, with configurable latency, jitter, error rate and payload size.
+
+Run standalone to get servers for manual testing:
+
+    python benchmarks/mock_providers.py --latency 500 --jitter 100 --error-rate 0.05
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import struct
+import sys
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_png(payload_bytes):
+    """
+    Build a valid RGB PNG of roughly payload_bytes
+
+    The pixels are random, so the compressed size stays close to the raw size.
+    """
+    side = max(int((payload_bytes / 3) ** 0.5), 1)
+    raw = b"".join(b"\x00" + os.urandom(side * 3) for _ in range(side))
+
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xffffffff)
+
+    header = struct.pack(">IIBBBBB", side, side, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(raw, 1)) + chunk(b"IEND", b""))
+
+
+class ProviderProfile:
+    """Latency, jitter, error rate and payload size of one mock provider"""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, payload_bytes=256 * 1024):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.payload_bytes = payload_bytes
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._png = None
+
+    def png(self):
+        """Return the PNG payload for this provider, built once"""
+        with self._lock:
+            if self._png is None:
+                self._png = make_png(self.payload_bytes)
+            return self._png
+
+    def delay(self):
+        """Sleep for the configured latency plus uniform jitter"""
+        delay_ms = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(delay_ms, 0) / 1000)
+
+    def should_fail(self):
+        """Count a request and decide whether it should return an error"""
+        with self._lock:
+            self.requests += 1
+            failed = random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            return failed
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "errors": self.errors}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Base handler: applies the profile, then dispatches to handle_<method>"""
+
+    profile = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_bytes(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self, method):
+        body = self.read_body()
+        self.profile.delay()
+        if self.profile.should_fail():
+            # Alternate between rate limiting and server errors
+            if random.random() < 0.5:
+                return self.send_json({"error": "rate limited"}, 429, {"Retry-After": "1"})
+            return self.send_json({"error": "injected failure"}, 500)
+        handler = getattr(self, f"handle_{method}", None)
+        if handler is None:
+            return self.send_json({"error": "not found"}, 404)
+        return handler(body)
+
+    def do_GET(self):
+        self.handle_request("get")
+
+    def do_POST(self):
+        self.handle_request("post")
+
+
+class NillionHandler(MockHandler):
+    """POST /v1/chat/completions returning one short prompt per line"""
+
+    def handle_post(self, body):
+        request = json.loads(body or b"{}")
+        user_message = request.get("messages", [{}])[-1].get("content", "")
+        count = 3
+        for word in user_message.split():
+            if word.isdigit():
+                count = int(word)
+                break
+        lines = [f"n3lson man mock scene {i+1} golden hour photo" for i in range(count)]
+        self.send_json({"choices": [{"message": {"role": "assistant", "content": "\n".join(lines)}}]})
+
+
+class TogetherHandler(MockHandler):
+    """POST /v1/images/generations returning n base64 images"""
+
+    def handle_post(self, body):
+        request = json.loads(body or b"{}")
+        image_b64 = base64.b64encode(self.profile.png()).decode("ascii")
+        data = [{"index": i, "b64_json": image_b64} for i in range(int(request.get("n", 1)))]
+        self.send_json({"id": uuid.uuid4().hex, "model": request.get("model"), "object": "list", "data": data})
+
+
+class AbloHandler(MockHandler):
+    """POST /image-maker returning variant URLs, GET /cdn/<id>.png serving them"""
+
+    variants = 3
+
+    def handle_post(self, body):
+        host = self.headers.get("Host")
+        images = [{"url": f"http://{host}/cdn/{uuid.uuid4().hex}.png"} for _ in range(self.variants)]
+        self.send_json({"images": images})
+
+    def handle_get(self, body):
+        if not self.path.startswith("/cdn/"):
+            return self.send_json({"error": "not found"}, 404)
+        self.send_bytes(self.profile.png(), "image/png")
+
+
+class PinataHandler(MockHandler):
+    """POST /pinning/pinFileToIPFS returning a fake CID"""
+
+    def handle_post(self, body):
+        self.send_json({
+            "IpfsHash": "Qm" + uuid.uuid4().hex + uuid.uuid4().hex[:12],
+            "PinSize": len(body),
+            "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        })
+
+
+HANDLERS = {
+    "nillion": NillionHandler,
+    "together": TogetherHandler,
+    "ablo": AbloHandler,
+    "pinata": PinataHandler,
+}
+
+
+class MockProviders:
+    """
+    Run every mock provider on its own local port
+
+    Use as a context manager; env() returns the variables that point app.py at
+    the mocks.
+    """
+
+    def __init__(self, profiles=None, host="127.0.0.1"):
+        self.host = host
+        self.profiles = {name: ProviderProfile() for name in HANDLERS}
+        self.profiles.update(profiles or {})
+        self.servers = {}
+
+    def start(self):
+        for name, handler in HANDLERS.items():
+            handler_class = type(handler.__name__, (handler,), {"profile": self.profiles[name]})
+            server = ThreadingHTTPServer((self.host, 0), handler_class)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name=f"mock-{name}", daemon=True).start()
+            self.servers[name] = server
+        return self
+
+    def stop(self):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+        self.servers = {}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def url(self, name):
+        return f"http://{self.host}:{self.servers[name].server_address[1]}"
+
+    def env(self):
+        """Environment variables that route app.py and the mock uploader to the mocks"""
+        return {
+            "NILAI_API_URL": self.url("nillion"),
+            "NILAI_API_KEY": "mock",
+            "TOGETHER_BASE_URL": self.url("together") + "/v1",
+            "TOGETHER_API_KEY": "mock",
+            "ABLO_API_URL": self.url("ablo"),
+            "ABLO_KEY": "mock",
+            "MOCK_PINATA_URL": self.url("pinata"),
+        }
+
+    def stats(self):
+        return {name: profile.stats() for name, profile in self.profiles.items()}
+
+
+def add_profile_arguments(parser):
+    """Add --latency/--jitter/--error-rate/--payload-kb and per-provider overrides"""
+    parser.add_argument("--latency", type=float, default=200, help="Base latency in ms (default: 200)")
+    parser.add_argument("--jitter", type=float, default=50, help="Uniform jitter in ms (default: 50)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail (default: 0)")
+    parser.add_argument("--payload-kb", type=int, default=256, help="Approximate image size in KB (default: 256)")
+    parser.add_argument("--provider-latency", action="append", default=[], metavar="NAME=MS",
+                        help="Override the latency of one provider, e.g. together=3000")
+
+
+def profiles_from_args(args):
+    """Build provider profiles from parsed add_profile_arguments options"""
+    overrides = dict(item.split("=", 1) for item in args.provider_latency)
+    return {
+        name: ProviderProfile(float(overrides.get(name, args.latency)), args.jitter,
+                              args.error_rate, args.payload_kb * 1024)
+        for name in HANDLERS
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run local mock providers for app.py")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    with MockProviders(profiles_from_args(args)) as mocks:
+        print("Mock providers running. Point app.py at them with:")
+        for name, value in mocks.env().items():
+            print(f"export {name}={value}")
+        print(f"export STORY_UPLOADER_CMD='{sys.executable} benchmarks/mock_uploader.py'")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            print(json.dumps(mocks.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
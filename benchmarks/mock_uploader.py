@@ -0,0 +1,102 @@
+"""
+Stand-in for `node story-integration/storyUploader.js --daemon`
+
+Speaks the same JSON-lines protocol on stdin/stdout. Uploads post the image to
+the mock Pinata server (MOCK_PINATA_URL) and then wait MOCK_REGISTER_LATENCY_MS
+to simulate the on-chain registration. Batch items are pipelined like the real
+uploader: pins and registrations have separate concurrency limits.
+
+Point app.py at it with:
+
+    STORY_UPLOADER_CMD="python benchmarks/mock_uploader.py"
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+PINATA_URL = os.environ.get("MOCK_PINATA_URL", "")
+REGISTER_LATENCY_MS = float(os.environ.get("MOCK_REGISTER_LATENCY_MS", "1000"))
+REGISTER_JITTER_MS = float(os.environ.get("MOCK_REGISTER_JITTER_MS", "200"))
+
+pin_slots = threading.BoundedSemaphore(int(os.environ.get("STORY_PIN_CONCURRENCY", "4")))
+register_slots = threading.BoundedSemaphore(int(os.environ.get("STORY_REGISTER_CONCURRENCY", "4")))
+output_lock = threading.Lock()
+executor = ThreadPoolExecutor(max_workers=64)
+
+
+def send_message(message):
+    with output_lock:
+        sys.stdout.write(json.dumps(message) + "\n")
+        sys.stdout.flush()
+
+
+def pin(image_path):
+    with pin_slots:
+        if not PINATA_URL:
+            return "Qm" + uuid.uuid4().hex
+        with open(image_path, "rb") as f:
+            request = urllib.request.Request(f"{PINATA_URL}/pinning/pinFileToIPFS", data=f.read(), method="POST")
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())["IpfsHash"]
+
+
+def register(ipfs_cid, prompt):
+    with register_slots:
+        delay_ms = REGISTER_LATENCY_MS + random.uniform(-REGISTER_JITTER_MS, REGISTER_JITTER_MS)
+        time.sleep(max(delay_ms, 0) / 1000)
+    tx_hash = "0x" + uuid.uuid4().hex + uuid.uuid4().hex
+    return {
+        "txHash": tx_hash,
+        "ipfsCid": ipfs_cid,
+        "ipId": "0x" + uuid.uuid4().hex[:40],
+        "title": f"AI Generated: {prompt[:50]}",
+        "viewUrl": f"https://ipfs.io/ipfs/{ipfs_cid}",
+        "explorerUrl": f"https://explorer.aeneid.storyrpc.io/tx/{tx_hash}",
+        "ipAssetUrl": None
+    }
+
+
+def upload(image_path, prompt):
+    return register(pin(image_path), prompt)
+
+
+def upload_item(item):
+    try:
+        return {"imagePath": item["imagePath"], "ok": True, "result": upload(item["imagePath"], item["prompt"])}
+    except Exception as e:
+        return {"imagePath": item["imagePath"], "ok": False, "error": str(e)}
+
+
+def handle_request(request):
+    request_id = request.get("id")
+    try:
+        if request.get("type") == "ping":
+            result = "pong"
+        elif request.get("type") == "upload":
+            result = upload(request["imagePath"], request["prompt"])
+        elif request.get("type") == "batch":
+            with ThreadPoolExecutor(max_workers=max(len(request["items"]), 1)) as batch_executor:
+                result = list(batch_executor.map(upload_item, request["items"]))
+        else:
+            raise ValueError(f"Unknown request type: {request.get('type')}")
+        send_message({"id": request_id, "ok": True, "result": result})
+    except Exception as e:
+        send_message({"id": request_id, "ok": False, "error": str(e)})
+
+
+def main():
+    send_message({"type": "ready", "address": "0x" + "0" * 40})
+    for line in sys.stdin:
+        if line.strip():
+            executor.submit(handle_request, json.loads(line))
+    executor.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Offline benchmark harness for the image pipeline
+
+Starts the local provider mocks from mock_providers.py, points app.py at them
+and drives create_images_from_concept, /api/generate-image and the Story
+Protocol upload path at fixed concurrency levels. Reports throughput and
+p50/p95/p99 latency per stage, and can save the results as a JSON baseline or
+compare against a previous one.
+
+    python benchmarks/run_benchmarks.py --concurrency 1,4,16 --requests 32 --save-baseline baseline.json
+    python benchmarks/run_benchmarks.py --compare baseline.json
+    python benchmarks/run_benchmarks.py --smoke
+
+Exits with status 1 when every request of a scenario fails, so a smoke run
+catches a broken pipeline.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCHMARK_DIR)
+
+from mock_providers import MockProviders, add_profile_arguments, make_png, profiles_from_args  # noqa: E402
+
+SCENARIOS = ("concept", "api", "upload")
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class StageRecorder:
+    """Collects latency samples per stage by wrapping the pipeline's entry points"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self.samples = defaultdict(list)
+
+    def wrap(self, owner, attribute, stage):
+        """Replace owner.attribute with a version that records its duration"""
+        original = getattr(owner, attribute)
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+
+        setattr(owner, attribute, timed)
+
+    def summary(self):
+        with self._lock:
+            return {
+                stage: {
+                    "count": len(samples),
+                    "p50": percentile(samples, 0.50),
+                    "p95": percentile(samples, 0.95),
+                    "p99": percentile(samples, 0.99),
+                }
+                for stage, samples in sorted(self.samples.items())
+            }
+
+
+def instrument(app, recorder):
+    """Wrap prompt expansion, provider I/O, image saves and uploads"""
+    recorder.wrap(app, "generate_image_prompts", "prompts")
+    recorder.wrap(app.image_store, "put", "save")
+    recorder.wrap(app.story_uploader, "upload_batch", "upload")
+    recorder.wrap(app.clients.together(os.environ["TOGETHER_API_KEY"]).images, "generate", "provider.together")
+    recorder.wrap(app.clients.session("ablo"), "request", "provider.ablo")
+
+
+def run_level(job, concurrency, requests, recorder):
+    """Run job() `requests` times with `concurrency` in flight and collect the results"""
+    recorder.reset()
+    errors = []
+
+    def run_one(_):
+        started = time.perf_counter()
+        try:
+            job()
+        except Exception as e:
+            errors.append(str(e))
+        finally:
+            recorder.record("total", time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run_one, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": requests,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "seconds": elapsed,
+        "throughput": requests / elapsed if elapsed else None,
+        "stages": recorder.summary(),
+    }
+
+
+def make_jobs(app, args):
+    """Build one callable per scenario that performs a single benchmark request"""
+    import requests
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="benchmark-flask", daemon=True).start()
+    api_url = f"http://127.0.0.1:{server.server_port}/api/generate-image"
+    session = requests.Session()
+
+    def concept_job():
+        images, _ = app.create_images_from_concept(args.concept, args.variations, args.provider,
+                                                   upload_to_story=False, display=False)
+        if not images:
+            raise RuntimeError("No images generated")
+
+    def api_job():
+        response = session.post(api_url, json={"prompt": args.concept, "provider": args.provider})
+        response.raise_for_status()
+
+    sample_image = app.image_store.put(make_png(args.payload_kb * 1024), {"prompt": "benchmark upload"})
+
+    def upload_job():
+        records = app.story_uploader.upload_batch([(sample_image["path"], "benchmark upload")] * args.upload_batch)
+        failed = [record for record in records if not record.get("ok")]
+        if failed:
+            raise RuntimeError(f"{len(failed)} uploads failed")
+
+    return {"concept": concept_job, "api": api_job, "upload": upload_job}, server
+
+
+def format_ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.0f}"
+
+
+def print_report(results, out):
+    for scenario, levels in results.items():
+        print(f"\n== {scenario} ==", file=out)
+        for level, result in levels.items():
+            print(f"concurrency {level}: {result['throughput']:.2f} req/s, "
+                  f"{result['errors']}/{result['requests']} errors", file=out)
+            if result.get("first_error"):
+                print(f"  first error: {result['first_error']}", file=out)
+            print(f"  {'stage':<20}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}", file=out)
+            for stage, stats in result["stages"].items():
+                print(f"  {stage:<20}{stats['count']:>7}{format_ms(stats['p50']):>10}"
+                      f"{format_ms(stats['p95']):>10}{format_ms(stats['p99']):>10}", file=out)
+
+
+def compare(results, baseline, tolerance, out):
+    """
+    Compare throughput and p95 latencies against a baseline
+
+    Returns:
+        list: Descriptions of metrics that regressed by more than tolerance
+    """
+    regressions = []
+    print(f"\n== comparison against baseline (tolerance {tolerance:.0%}) ==", file=out)
+    for scenario, levels in results.items():
+        for level, result in levels.items():
+            previous = baseline.get("results", {}).get(scenario, {}).get(level)
+            if not previous:
+                continue
+            checks = [("throughput", previous["throughput"], result["throughput"], True)]
+            for stage, stats in result["stages"].items():
+                old_stats = previous["stages"].get(stage)
+                if old_stats and old_stats["p95"] and stats["p95"]:
+                    checks.append((f"{stage} p95", old_stats["p95"], stats["p95"], False))
+            for name, old, new, higher_is_better in checks:
+                change = (new - old) / old if old else 0.0
+                regressed = change < -tolerance if higher_is_better else change > tolerance
+                marker = "REGRESSION" if regressed else ""
+                print(f"  {scenario} c={level} {name}: {old:.4f} -> {new:.4f} ({change:+.1%}) {marker}", file=out)
+                if regressed:
+                    regressions.append(f"{scenario} c={level} {name}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the image pipeline against local provider mocks")
+    add_profile_arguments(parser)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated scenarios to run (default: {','.join(SCENARIOS)})")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels (default: 1,4,16)")
+    parser.add_argument("--requests", type=int, default=16, help="Requests per concurrency level (default: 16)")
+    parser.add_argument("--concept", default="on beach with sunglasses", help="Concept to generate")
+    parser.add_argument("--provider", choices=["together", "ablo"], default="together")
+    parser.add_argument("--variations", type=int, default=3, help="Variations per concept request (default: 3)")
+    parser.add_argument("--upload-batch", type=int, default=4, help="Images per upload request (default: 4)")
+    parser.add_argument("--register-latency", type=float, default=1000,
+                        help="Simulated on-chain registration latency in ms (default: 1000)")
+    parser.add_argument("--prompt-cache", action="store_true", help="Leave the prompt expansion cache enabled")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write the results to a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="Compare the results against a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Allowed relative regression before --compare fails (default: 0.10)")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own output")
+    parser.add_argument("--smoke", action="store_true",
+                        help="Quick end-to-end check: 2 requests per scenario at concurrency 1 with low mock latency")
+    args = parser.parse_args()
+    if args.smoke:
+        args.concurrency, args.requests = "1", 2
+        args.latency, args.jitter, args.register_latency = 10, 0, 10
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    scenarios = [scenario for scenario in args.scenarios.split(",") if scenario]
+    out = sys.stdout
+
+    with MockProviders(profiles_from_args(args)) as mocks, tempfile.TemporaryDirectory() as workdir:
+        # app.py reads its configuration at import time, so set it up first
+        os.environ.update(mocks.env())
+        os.environ["IMAGE_STORE_ROOT"] = os.path.join(workdir, "images")
+        os.environ["IMAGE_CATALOG_PATH"] = os.path.join(workdir, "image_catalog.sqlite")
+        os.environ["PROMPT_CACHE_PATH"] = os.path.join(workdir, "prompt_cache.sqlite")
+        os.environ["STORY_UPLOADER_CMD"] = f"{sys.executable} {os.path.join(BENCHMARK_DIR, 'mock_uploader.py')}"
+        os.environ["MOCK_REGISTER_LATENCY_MS"] = str(args.register_latency)
+        if not args.prompt_cache:
+            os.environ["PROMPT_CACHE_DISABLED"] = "1"
+
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with quiet:
+            import app
+            recorder = StageRecorder()
+            instrument(app, recorder)
+            jobs, server = make_jobs(app, args)
+
+            results = {}
+            for scenario in scenarios:
+                results[scenario] = {}
+                for level in levels:
+                    print(f"Running {scenario} at concurrency {level}...", file=sys.stderr)
+                    results[scenario][str(level)] = run_level(jobs[scenario], level, args.requests, recorder)
+            server.shutdown()
+            app.story_uploader.close()
+
+        print_report(results, out)
+        print(f"\nMock provider requests: {json.dumps(mocks.stats())}", file=out)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}", file=out)
+
+    status = 0
+    broken = [f"{scenario} c={level}" for scenario, levels in results.items()
+              for level, result in levels.items() if result["errors"] == result["requests"]]
+    if broken:
+        print(f"\nEvery request failed in: {', '.join(broken)}", file=out)
+        status = 1
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, out)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed: {', '.join(regressions)}", file=out)
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
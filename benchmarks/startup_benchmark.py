@@ -0,0 +1,167 @@
+"""
+Startup-time benchmark for app.py and main.py
+
+Measures, in fresh interpreters, how long each entry path takes to become
+ready and which imports it spends that time on:
+
+- cli: `import app`, everything a one-shot CLI run loads before main() starts
+- serve: `import app` plus creating the Flask app, as `--serve` does
+- streamlit: `import main` plus building the LangChain agent, as the first
+  Streamlit run does
+
+Wall time is the median of --runs runs. The import breakdown comes from
+`python -X importtime`.
+
+    python benchmarks/startup_benchmark.py --runs 10 --save-baseline startup.json
+    python benchmarks/startup_benchmark.py --compare startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARK_DIR)
+
+# Each snippet prints nothing and exits once the path is ready to do work
+PATHS = {
+    "cli": "import app",
+    "serve": "import app; app.get_app()",
+    "streamlit": "import main; main.get_agent_executor()",
+}
+
+
+def run_snippet(snippet, importtime=False):
+    """
+    Run snippet in a fresh interpreter from the repo root
+
+    Returns:
+        tuple: (wall seconds, completed process)
+    """
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", snippet]
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    env.setdefault("TOGETHER_API_KEY", "startup-benchmark")
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    return time.perf_counter() - started, completed
+
+
+def parse_importtime(stderr):
+    """
+    Parse `-X importtime` output into per-package cumulative import times
+
+    A package's time includes the modules it imports itself, so the numbers
+    overlap and do not add up to the wall time.
+
+    Returns:
+        dict: Top-level package name -> cumulative import seconds
+    """
+    packages = {}
+    for line in stderr.splitlines():
+        fields = line.split("|")
+        if not line.startswith("import time:") or len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        if "." not in name:
+            packages[name] = max(packages.get(name, 0.0), int(fields[1]) / 1e6)
+    return packages
+
+
+def measure(name, snippet, runs):
+    """Time one path over runs fresh interpreters and take its import breakdown"""
+    samples = []
+    for _ in range(runs):
+        seconds, completed = run_snippet(snippet)
+        if completed.returncode != 0:
+            error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "unknown error"
+            return {"error": error}
+        samples.append(seconds)
+    _, completed = run_snippet(snippet, importtime=True)
+    return {
+        "runs": runs,
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "imports": parse_importtime(completed.stderr),
+    }
+
+
+def print_report(results, top, out):
+    for name, result in results.items():
+        print(f"\n== {name} ==", file=out)
+        if "error" in result:
+            print(f"  failed: {result['error']}", file=out)
+            continue
+        print(f"  wall: median {result['median'] * 1000:.0f} ms, min {result['min'] * 1000:.0f} ms "
+              f"over {result['runs']} runs", file=out)
+        heaviest = sorted(result["imports"].items(), key=lambda item: item[1], reverse=True)[:top]
+        for package, seconds in heaviest:
+            print(f"  {package:<30}{seconds * 1000:>10.1f} ms", file=out)
+
+
+def compare(results, baseline, tolerance, out):
+    """
+    Compare median wall times against a baseline
+
+    Returns:
+        list: Names of paths that got slower by more than tolerance
+    """
+    regressions = []
+    print(f"\n== comparison against baseline (tolerance {tolerance:.0%}) ==", file=out)
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if "error" in result or not previous or "error" in previous:
+            continue
+        old, new = previous["median"], result["median"]
+        change = (new - old) / old if old else 0.0
+        regressed = change > tolerance
+        marker = "REGRESSION" if regressed else ""
+        print(f"  {name}: {old * 1000:.0f} ms -> {new * 1000:.0f} ms ({change:+.1%}) {marker}", file=out)
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the startup time of the CLI, API and Streamlit paths")
+    parser.add_argument("--paths", default=",".join(PATHS),
+                        help=f"Comma-separated paths to measure (default: {','.join(PATHS)})")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per path (default: 5)")
+    parser.add_argument("--top", type=int, default=10, help="Heaviest imports to list per path (default: 10)")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write the results to a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="Compare the results against a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Allowed relative slowdown before --compare fails (default: 0.10)")
+    args = parser.parse_args()
+
+    out = sys.stdout
+    results = {}
+    for name in [name for name in args.paths.split(",") if name]:
+        print(f"Measuring {name}...", file=sys.stderr)
+        results[name] = measure(name, PATHS[name], args.runs)
+    print_report(results, args.top, out)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                                "python": sys.version.split()[0]},
+                       "results": results}, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}", file=out)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, out)
+        if regressions:
+            print(f"\n{len(regressions)} path(s) regressed: {', '.join(regressions)}", file=out)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
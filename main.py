@@ -1,17 +1,14 @@
 import os
+import time
+import asyncio
+import threading
+import weakref
 from typing import List, Dict, Any, Optional
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_core.output_parsers import StrOutputParser
-from langchain_community.llms import Together
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain.tools import BaseTool
-from langchain.agents import create_structured_chat_agent, AgentExecutor
-from langchain.tools.render import format_tool_to_openai_function
-import requests
 import json
 import base64
 from io import BytesIO
-from PIL import Image
 import streamlit as st
 from dotenv import load_dotenv
 
@@ -21,17 +18,52 @@ load_dotenv()
 # Get API key from environment variables
 TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY")
 
-# Verify API key is available
-if not TOGETHER_API_KEY:
-    raise ValueError("TOGETHER_API_KEY not found in environment variables. Please check your .env file.")
+# Agent runs (and so image tool calls) in flight at once for one submission
+AGENT_CONCURRENCY = int(os.getenv("AGENT_CONCURRENCY", "4"))
 
-# LLM Setup
-llm = Together(
-    model="meta-llama/Meta-Llama-3.1-70B-Instruct-Turbo",
-    temperature=0.7,
-    max_tokens=1024,
-    together_api_key=TOGETHER_API_KEY
-)
+# The LLM, the agent and their LangChain dependencies are created on first use,
+# so importing this module stays cheap and does not need the API key. Streamlit
+# re-runs this script on every interaction; st.cache_resource keeps one instance
+# per process across reruns and sessions.
+@st.cache_resource
+def get_llm():
+    """Create the Together LLM once and reuse it"""
+    # Verify API key is available
+    if not TOGETHER_API_KEY:
+        raise ValueError("TOGETHER_API_KEY not found in environment variables. Please check your .env file.")
+    
+    from langchain_community.llms import Together
+    
+    return Together(
+        model="meta-llama/Meta-Llama-3.1-70B-Instruct-Turbo",
+        temperature=0.7,
+        max_tokens=1024,
+        together_api_key=TOGETHER_API_KEY
+    )
+
+# Together image API used by the tool, the seconds a call may take, and the
+# connections the async client keeps open per event loop
+IMAGE_API_URL = "https://api.together.xyz/v1/image/generation"
+IMAGE_TOOL_TIMEOUT = float(os.getenv("IMAGE_TOOL_TIMEOUT", "120"))
+IMAGE_TOOL_MAX_CONNECTIONS = int(os.getenv("IMAGE_TOOL_MAX_CONNECTIONS", "10"))
+
+# One pooled httpx.AsyncClient per event loop; a client cannot be shared across loops
+_async_clients = weakref.WeakKeyDictionary()
+
+def get_async_client():
+    """Return the pooled httpx.AsyncClient of the running event loop"""
+    import httpx
+    
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=IMAGE_TOOL_TIMEOUT,
+            limits=httpx.Limits(max_connections=IMAGE_TOOL_MAX_CONNECTIONS,
+                                max_keepalive_connections=IMAGE_TOOL_MAX_CONNECTIONS)
+        )
+        _async_clients[loop] = client
+    return client
 
 # Image Generation Tool
 class ImageGenerationTool(BaseTool):
@@ -43,53 +75,60 @@ class ImageGenerationTool(BaseTool):
     Input should be a detailed description of the image to generate.
     """
     
+    def _request(self, prompt: str) -> Dict[str, Any]:
+        """Headers and JSON payload of the Together request for prompt"""
+        headers = {
+            "Authorization": f"Bearer {TOGETHER_API_KEY}",
+            "Content-Type": "application/json"
+        }
+        
+        payload = {
+            "model": "black-forest-labs/FLUX.1-dev-lora",
+            "image_loras": [{"path":"http://hills.ccsf.edu/~clai74/nelson_unet.safetensors","scale":1}],
+            "prompt": "n3lson man "+prompt,
+            "negative_prompt": "low quality, blurry, distorted features, unrealistic, bad anatomy, multiple limbs, excessive limbs",
+            "height": 1024,
+            "width": 768,
+            "steps": 30,
+            "seed": 42,
+            "num_images": 1
+        }
+        return {"headers": headers, "json": payload}
+    
+    def _result(self, status_code: int, text: str) -> str:
+        """Turn the Together response into the tool's output"""
+        if status_code == 200:
+            result = json.loads(text)
+            image_b64 = result["output"]["images"][0]
+            
+            # For Streamlit, we'll return the base64 string to display
+            return f"Image generated successfully! Base64: {image_b64}"
+        else:
+            return f"Error generating image: {status_code} - {text}"
+    
     def _run(self, prompt: str) -> str:
         """Run the image generation based on the prompt."""
         try:
-            headers = {
-                "Authorization": f"Bearer {TOGETHER_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "model": "black-forest-labs/FLUX.1-dev-lora",
-                "image_loras": [{"path":"http://hills.ccsf.edu/~clai74/nelson_unet.safetensors","scale":1}],
-                "prompt": "n3lson man "+prompt,
-                "negative_prompt": "low quality, blurry, distorted features, unrealistic, bad anatomy, multiple limbs, excessive limbs",
-                "height": 1024,
-                "width": 768,
-                "steps": 30,
-                "seed": 42,
-                "num_images": 1
-            }
-            
-            response = requests.post(
-                "https://api.together.xyz/v1/image/generation",
-                headers=headers,
-                json=payload
-            )
+            import requests
             
-            if response.status_code == 200:
-                result = response.json()
-                image_b64 = result["output"]["images"][0]
-                
-                # For Streamlit, we'll return the base64 string to display
-                return f"Image generated successfully! Base64: {image_b64}"
-            else:
-                return f"Error generating image: {response.status_code} - {response.text}"
+            response = requests.post(IMAGE_API_URL, timeout=IMAGE_TOOL_TIMEOUT, **self._request(prompt))
+            return self._result(response.status_code, response.text)
         except Exception as e:
             return f"Error: {str(e)}"
     
-    def _arun(self, prompt: str) -> None:
-        """Async version (not implemented)"""
-        raise NotImplementedError("Async version not implemented")
+    async def _arun(self, prompt: str) -> str:
+        """Run the image generation without blocking the event loop"""
+        try:
+            response = await get_async_client().post(IMAGE_API_URL, **self._request(prompt))
+            return self._result(response.status_code, response.text)
+        except Exception as e:
+            return f"Error: {str(e)}"
 
 # Create the image generation tool
 image_tool = ImageGenerationTool()
 
 # Format the tool for the agent
 tools = [image_tool]
-llm_with_tools = llm.bind(functions=[format_tool_to_openai_function(t) for t in tools])
 
 # Updated Prompt Template for the agent
 system_message = """
@@ -112,25 +151,166 @@ Remember to keep the content tasteful and appropriate for a mainstream audience.
 After generating the prompt, use the image_generator tool to create the image.
 """
 
-# Fix: Properly structure the prompt template for a structured chat agent
-prompt = ChatPromptTemplate.from_messages(
-    [
-        SystemMessage(content=system_message),
-        MessagesPlaceholder(variable_name="chat_history", optional=True),
-        HumanMessage(content="Generate content for the following keyword idea: {keyword}"),
-        MessagesPlaceholder(variable_name="agent_scratchpad"),
+@st.cache_resource
+def get_agent_executor():
+    """Bind the tools, build the prompt and create the agent executor once"""
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+    from langchain_core.messages import HumanMessage, SystemMessage
+    from langchain.agents import create_structured_chat_agent, AgentExecutor
+    from langchain.tools.render import format_tool_to_openai_function
+    
+    llm_with_tools = get_llm().bind(functions=[format_tool_to_openai_function(t) for t in tools])
+    
+    # Fix: Properly structure the prompt template for a structured chat agent
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            SystemMessage(content=system_message),
+            MessagesPlaceholder(variable_name="chat_history", optional=True),
+            HumanMessage(content="Generate content for the following keyword idea: {keyword}"),
+            MessagesPlaceholder(variable_name="agent_scratchpad"),
+        ]
+    )
+    
+    # Create the agent with the fixed prompt
+    agent = create_structured_chat_agent(llm_with_tools, tools, prompt)
+    return AgentExecutor(agent=agent, tools=tools, verbose=True)
+
+def __getattr__(name):
+    # `main.llm` and `main.agent_executor` are still available, created on first access
+    if name == "llm":
+        return get_llm()
+    if name == "agent_executor":
+        return get_agent_executor()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+@st.cache_resource
+def get_event_loop():
+    """Event loop on a background thread that runs agent generations for every session"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="agent-loop", daemon=True).start()
+    return loop
+
+class ProgressHandler(BaseCallbackHandler):
+    """Records one agent run's steps from the event loop so the script can show them"""
+    
+    def __init__(self, steps, keyword):
+        self.steps = steps
+        self.keyword = keyword
+    
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.steps.append(f"{self.keyword}: writing the image prompt...")
+    
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.steps.append(f"{self.keyword}: generating the image...")
+    
+    def on_tool_end(self, output, **kwargs):
+        self.steps.append(f"{self.keyword}: image generated")
+
+def normalize_keyword(keyword):
+    """Session cache key: the keyword ignoring case and spacing"""
+    return " ".join(keyword.lower().split())
+
+async def generate_content(keywords, agent_executor, steps=None):
+    """
+    Run the agent for several keywords concurrently
+    
+    The runs call the image tool through its async _arun, so up to
+    AGENT_CONCURRENCY image generations share one event loop.
+    
+    Args:
+        keywords (list): Keyword ideas
+        agent_executor (AgentExecutor): Agent to run
+        steps (list, optional): Receives a progress line for every agent step
+    
+    Returns:
+        list: The agent's output for each keyword, or the exception its run raised
+    """
+    configs = [
+        {"callbacks": [ProgressHandler(steps, keyword)] if steps is not None else [],
+         "max_concurrency": AGENT_CONCURRENCY}
+        for keyword in keywords
     ]
-)
+    results = await agent_executor.abatch([{"keyword": keyword} for keyword in keywords], configs,
+                                          return_exceptions=True)
+    return [result if isinstance(result, Exception) else result["output"] for result in results]
 
-# Create the agent with the fixed prompt
-agent = create_structured_chat_agent(llm_with_tools, tools, prompt)
-agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+def start_generation(keywords):
+    """
+    Start the agent runs for keywords on the background event loop
+    
+    Returns:
+        dict: The keywords, the Future of their outputs and the progress steps
+    """
+    agent_executor = get_agent_executor()
+    steps = []
+    future = asyncio.run_coroutine_threadsafe(generate_content(keywords, agent_executor, steps), get_event_loop())
+    return {"keywords": keywords, "future": future, "steps": steps, "started": time.time()}
+
+def wait_for_generation(job):
+    """
+    Show the agent's progress until its runs finish
+    
+    The runs continue on the event loop if Streamlit stops this script for a
+    rerun. The next run picks the job up from st.session_state.
+    
+    Returns:
+        list: The agent's output for each keyword, or the exception its run raised
+    """
+    with st.status(f"Generating content for {len(job['keywords'])} keyword(s)...", expanded=True) as status:
+        shown = 0
+        while True:
+            steps = job["steps"]
+            for step in steps[shown:]:
+                st.write(step)
+            shown = len(steps)
+            if job["future"].done():
+                break
+            time.sleep(0.25)
+        
+        elapsed = time.time() - job["started"]
+        if job["future"].exception() is not None:
+            status.update(label=f"Generation failed after {elapsed:.1f}s", state="error")
+        else:
+            status.update(label=f"Generated in {elapsed:.1f}s", state="complete", expanded=False)
+    return job["future"].result()
+
+def show_result(keyword, output):
+    """Display the agent's output for keyword and the image it generated"""
+    st.subheader(f"Generated Content: {keyword}")
+    st.write(output)
+    
+    # Check if there's a base64 image in the output
+    if "Base64:" in output:
+        try:
+            base64_start = output.find("Base64:") + 7
+            # Find the end of the base64 string - either end of output or first non-base64 character
+            base64_text = output[base64_start:].strip()
+            
+            # In a real implementation, decode and display the image
+            st.write("Image generated successfully!")
+            
+            # Display image if we have valid base64 data
+            try:
+                from PIL import Image
+                
+                image_data = base64.b64decode(base64_text)
+                image = Image.open(BytesIO(image_data))
+                st.image(image, caption="Generated Image")
+            except Exception as e:
+                st.error(f"Error displaying image: {str(e)}")
+                st.write("Base64 data may be truncated or invalid")
+        except Exception as e:
+            st.error(f"Error processing image: {str(e)}")
 
 # Streamlit UI
 def main():
     st.title("Instagram Content Generator")
     st.write("Generate content ideas for your Instagram based on simple keywords")
     
+    # Per-session results by normalized keyword, and agent runs still in progress
+    results = st.session_state.setdefault("results", {})
+    pending = st.session_state.setdefault("pending", {})
+    
     # Example keyword ideas
     st.subheader("Example Keywords:")
     example_keywords = [
@@ -143,41 +323,49 @@ def main():
     
     st.write(", ".join(example_keywords))
     
-    # Input for keyword
-    keyword = st.text_input("Enter your keyword idea:")
+    # Input for keywords; several are generated concurrently
+    entries = {}
+    for line in st.text_area("Enter your keyword ideas (one per line):").splitlines():
+        if line.strip():
+            entries.setdefault(normalize_keyword(line), line.strip())
     
     if st.button("Generate Content"):
-        if keyword:
-            with st.spinner("Generating content..."):
-                # Run the agent
-                result = agent_executor.invoke({"keyword": keyword})
-                
-                # Display results
-                st.subheader("Generated Content")
-                st.write(result["output"])
-                
-                # Check if there's a base64 image in the output
-                if "Base64:" in result["output"]:
-                    try:
-                        base64_start = result["output"].find("Base64:") + 7
-                        # Find the end of the base64 string - either end of output or first non-base64 character
-                        base64_text = result["output"][base64_start:].strip()
-                        
-                        # In a real implementation, decode and display the image
-                        st.write("Image generated successfully!")
-                        
-                        # Display image if we have valid base64 data
-                        try:
-                            image_data = base64.b64decode(base64_text)
-                            image = Image.open(BytesIO(image_data))
-                            st.image(image, caption="Generated Image")
-                        except Exception as e:
-                            st.error(f"Error displaying image: {str(e)}")
-                            st.write("Base64 data may be truncated or invalid")
-                    except Exception as e:
-                        st.error(f"Error processing image: {str(e)}")
-        else:
+        if not entries:
             st.warning("Please enter a keyword idea")
+        else:
+            missing = [key for key in entries if key not in results and key not in pending]
+            if missing:
+                try:
+                    job = start_generation([entries[key] for key in missing])
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    job["keys"] = missing
+                    for key in missing:
+                        pending[key] = job
+    
+    # Wait for the runs of the current keywords; other runs keep going in the background
+    for job in list({id(job): job for job in pending.values()}.values()):
+        wanted = any(key in entries for key in job["keys"])
+        if not wanted and not job["future"].done():
+            continue
+        try:
+            outputs = wait_for_generation(job) if wanted else job["future"].result()
+        except Exception as e:
+            if not job["future"].done():
+                raise
+            outputs = [e] * len(job["keys"])
+        for key, output in zip(job["keys"], outputs):
+            del pending[key]
+            if not isinstance(output, Exception):
+                results[key] = output
+            elif key in entries:
+                st.error(f"Error generating content for '{entries[key]}': {str(output)}")
+    
+    # Previously generated keywords are shown again without calling the agent
+    for key, keyword in entries.items():
+        if key in results:
+            show_result(keyword, results[key])
 
 # Entry point for the application
 if __name__ == "__main__":
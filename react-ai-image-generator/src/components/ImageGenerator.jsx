@@ -33,8 +33,16 @@ const ImageGenerator = ({ onImageGenerated, isLoading, setIsLoading }) => {
     setIsLoading(true);
     
     try {
-      const response = await generateImage(prompt, useFlaskApi);
-      onImageGenerated(response.imageUrl, prompt, response.generatedAt);
+      if (useFlaskApi) {
+        // Show each image as soon as the Flask API streams it
+        await streamImages(prompt, (event) => {
+          onImageGenerated(event.imageUrl, prompt, event.generatedAt);
+          setIsLoading(false);
+        });
+      } else {
+        const response = await generateImage(prompt, useFlaskApi);
+        onImageGenerated(response.imageUrl, prompt, response.generatedAt);
+      }
     } catch (err) {
       console.error('Error generating image:', err);
       setError('An error occurred while generating your image. Please try again.');
@@ -86,6 +94,54 @@ const ImageGenerator = ({ onImageGenerated, isLoading, setIsLoading }) => {
     }
   }
 
+  // Stream NDJSON events from the Flask API, calling onImage for every image event
+  async function streamImages(prompt, onImage) {
+    const response = await fetch('http://localhost:5001/api/generate-stream', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ prompt }),
+    });
+    
+    if (!response.ok || !response.body) {
+      const errorData = await response.json().catch(() => ({ error: 'Unknown error' }));
+      throw new Error(errorData.error || `Server error: ${response.status}`);
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let imageCount = 0;
+    
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) {
+        break;
+      }
+      buffer += decoder.decode(value, { stream: true });
+      
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
+      for (const line of lines) {
+        if (!line.trim()) {
+          continue;
+        }
+        const event = JSON.parse(line);
+        if (event.type === 'image') {
+          imageCount += 1;
+          onImage(event);
+        } else if (event.type === 'error') {
+          throw new Error(event.error);
+        }
+      }
+    }
+    
+    if (imageCount === 0) {
+      throw new Error('No images were generated');
+    }
+  }
+
   return (
     <div className="generator-container">
       <form onSubmit={handleSubmit} className="generator-form">
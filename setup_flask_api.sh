@@ -16,7 +16,7 @@ fi
 
 # Install required packages
 echo "Installing required Python packages..."
-pip3 install flask flask-cors pillow together dotenv requests
+pip3 install flask flask-cors pillow together dotenv requests gunicorn gevent
 
 echo "Creating generated_images directory if it doesn't exist..."
 mkdir -p generated_images
@@ -24,5 +24,8 @@ mkdir -p generated_images
 echo "Setup complete! You can now run the API server with:"
 echo "python3 app.py --serve --port 5001"
 echo ""
+echo "For production, run it under gunicorn with gevent workers:"
+echo "python3 app.py --serve --production --port 5001 --workers 4"
+echo ""
 echo "The API will be available at:"
 echo "http://localhost:5001/api/generate-image" 
\ No newline at end of file
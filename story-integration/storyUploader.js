@@ -5,6 +5,110 @@ const pinataSDK = require('@pinata/sdk');
 const { StoryClient, StoryConfig } = require('@story-protocol/core-sdk');
 const { http } = require('viem');
 const { privateKeyToAccount } = require('viem/accounts');
+const readline = require('readline');
+
+// In daemon mode stdout carries the JSON-lines protocol, so send all logging to stderr
+const DAEMON_MODE = process.argv.includes('--daemon');
+if (DAEMON_MODE) {
+  console.log = (...args) => console.error(...args);
+}
+
+/**
+ * Create a nonce manager that hands out sequential nonces locally, so several
+ * registrations from the same account can be in flight at once. The starting
+ * nonce is read once from the pending block.
+ * A failed send can leave a gap in the local nonces. Re-reading the count while
+ * other sends are still in flight could hand out a nonce that is already taken,
+ * so after a failure new sends wait in acquire() until the outstanding ones have
+ * settled, and the nonce is re-synced with the chain only then.
+ * Implements the nonceManager interface viem reads from the account.
+ * @return {Object} - Nonce manager
+ */
+function createLocalNonceManager() {
+  let nextNonce = null;
+  let outstanding = 0;
+  let drained = null;
+  let resolveDrained = null;
+  
+  return {
+    async consume({ address, client }) {
+      if (nextNonce === null) {
+        nextNonce = client
+          .request({ method: 'eth_getTransactionCount', params: [address, 'pending'] })
+          .then(Number);
+      }
+      const nonce = nextNonce;
+      nextNonce = nonce.then((value) => value + 1);
+      return nonce;
+    },
+    async get({ address, client }) {
+      if (nextNonce === null) {
+        return Number(await client.request({ method: 'eth_getTransactionCount', params: [address, 'pending'] }));
+      }
+      return nextNonce;
+    },
+    increment() {},
+    reset() {
+      nextNonce = null;
+    },
+    /**
+     * Wait until a send may start and count it as outstanding
+     */
+    async acquire() {
+      while (drained) {
+        await drained;
+      }
+      outstanding++;
+    },
+    /**
+     * Mark a send as settled. After a failure the nonce is re-synced with the
+     * chain once no other sends are outstanding.
+     * @param {boolean} failed - Whether the send failed
+     */
+    release(failed) {
+      outstanding--;
+      if (failed && !drained) {
+        drained = new Promise((resolve) => { resolveDrained = resolve; });
+      }
+      if (drained && outstanding === 0) {
+        this.reset();
+        const resolve = resolveDrained;
+        drained = null;
+        resolveDrained = null;
+        resolve();
+      }
+    }
+  };
+}
+
+/**
+ * Create a limiter that runs at most `concurrency` tasks at a time
+ * @param {number} concurrency - Maximum number of tasks in flight
+ * @return {Function} - Wraps an async task and resolves with its result
+ */
+function createLimiter(concurrency) {
+  let active = 0;
+  const queue = [];
+  
+  const next = () => {
+    if (active >= concurrency || queue.length === 0) {
+      return;
+    }
+    active += 1;
+    const { task, resolve, reject } = queue.shift();
+    task()
+      .then(resolve, reject)
+      .finally(() => {
+        active -= 1;
+        next();
+      });
+  };
+  
+  return (task) => new Promise((resolve, reject) => {
+    queue.push({ task, resolve, reject });
+    next();
+  });
+}
 
 /**
  * Validate environment and configuration
@@ -84,6 +188,8 @@ console.log('Creating account from private key...');
 // Create account from private key using viem
 const privateKey = `0x${process.env.WALLET_PRIVATE_KEY.replace(/^0x/, '')}`;
 const account = privateKeyToAccount(privateKey);
+// Assign nonces locally so concurrent registrations do not collide
+account.nonceManager = createLocalNonceManager();
 console.log(`Account address: ${account.address}`);
 
 console.log('Setting up Story Protocol client...');
@@ -96,6 +202,11 @@ const config = {
 
 const storyClient = StoryClient.newClient(config);
 
+// Concurrency limits for batch uploads: IPFS pins and on-chain registrations
+// run in separate stages so later pins overlap earlier registrations
+const pinLimit = createLimiter(parseInt(process.env.STORY_PIN_CONCURRENCY || '4', 10));
+const registerLimit = createLimiter(parseInt(process.env.STORY_REGISTER_CONCURRENCY || '4', 10));
+
 /**
  * Upload an image to IPFS via Pinata
  * @param {string} imagePath - Path to the image file
@@ -187,7 +298,15 @@ async function registerOnStoryProtocol(ipfsCid, prompt) {
     console.log('Registration parameters:', JSON.stringify(registerParams, null, 2));
     
     // Use the ipAsset.register method with the proper parameters
-    const response = await storyClient.ipAsset.register(registerParams);
+    await account.nonceManager.acquire();
+    let response;
+    try {
+      response = await storyClient.ipAsset.register(registerParams);
+    } catch (error) {
+      account.nonceManager.release(true);
+      throw error;
+    }
+    account.nonceManager.release(false);
     
     // Extract transaction hash and IP Asset ID
     let txHash = '';
@@ -238,6 +357,53 @@ async function registerOnStoryProtocol(ipfsCid, prompt) {
   }
 }
 
+/**
+ * Upload an image to IPFS and register it on Story Protocol
+ * @param {string} imagePath - Path to the image file
+ * @param {string} prompt - The prompt used to generate the image
+ * @return {Promise<Object>} - Result of the registration
+ */
+async function uploadAndRegister(imagePath, prompt) {
+  // Upload to IPFS
+  const ipfsCid = await uploadToIPFS(imagePath, prompt);
+  
+  // Register on Story Protocol
+  return registerOnStoryProtocol(ipfsCid, prompt);
+}
+
+/**
+ * Upload and register several images as a pipeline. Each image is pinned and
+ * then registered, with pins and registrations limited separately, so pinning
+ * later images overlaps the registration of earlier ones. A failure only
+ * affects its own image, and so does a timeout: an image that has not finished
+ * within timeoutMs of the batch starting is reported as failed.
+ * @param {Array<Object>} items - Images to upload, each with imagePath and prompt
+ * @param {number} [timeoutMs] - Time each image may take, including queueing
+ * @return {Promise<Array<Object>>} - One record per item, in order, with either result or error
+ */
+async function uploadBatch(items, timeoutMs) {
+  return Promise.all(items.map(async ({ imagePath, prompt }) => {
+    let timer;
+    try {
+      const upload = (async () => {
+        const ipfsCid = await pinLimit(() => uploadToIPFS(imagePath, prompt));
+        return registerLimit(() => registerOnStoryProtocol(ipfsCid, prompt));
+      })();
+      const result = !timeoutMs ? await upload : await Promise.race([
+        upload,
+        new Promise((resolve, reject) => {
+          timer = setTimeout(() => reject(new Error(`Timed out after ${timeoutMs / 1000}s`)), timeoutMs);
+        })
+      ]);
+      return { imagePath, ok: true, result };
+    } catch (error) {
+      return { imagePath, ok: false, error: error.message };
+    } finally {
+      clearTimeout(timer);
+    }
+  }));
+}
+
 /**
  * Main function to upload an image and register it on Story Protocol
  * @param {string} imagePath - Path to the image file
@@ -249,11 +415,7 @@ async function uploadToStoryProtocol(imagePath, prompt) {
   console.log(`Prompt: ${prompt}`);
   
   try {
-    // Upload to IPFS
-    const ipfsCid = await uploadToIPFS(imagePath, prompt);
-    
-    // Register on Story Protocol
-    const result = await registerOnStoryProtocol(ipfsCid, prompt);
+    const result = await uploadAndRegister(imagePath, prompt);
     
     // Write result to a file for Python to read
     fs.writeFileSync(
@@ -300,6 +462,76 @@ Timestamp: ${new Date().toISOString()}`
   }
 }
 
+/**
+ * Write one protocol message to stdout as a single JSON line
+ * @param {Object} message - Message to send to the parent process
+ */
+function sendMessage(message) {
+  process.stdout.write(`${JSON.stringify(message)}\n`);
+}
+
+/**
+ * Handle one request received by the daemon
+ * @param {Object} request - Parsed request with an id and a type
+ * @return {Promise<void>}
+ */
+async function handleRequest(request) {
+  const { id, type } = request;
+  try {
+    if (type === 'ping') {
+      sendMessage({ id, ok: true, result: 'pong' });
+    } else if (type === 'upload') {
+      console.log(`[${id}] Uploading ${request.imagePath}`);
+      const result = await uploadAndRegister(request.imagePath, request.prompt);
+      sendMessage({ id, ok: true, result });
+    } else if (type === 'batch') {
+      console.log(`[${id}] Uploading batch of ${request.items.length} images`);
+      const result = await uploadBatch(request.items, request.timeout && request.timeout * 1000);
+      sendMessage({ id, ok: true, result });
+    } else {
+      throw new Error(`Unknown request type: ${type}`);
+    }
+  } catch (error) {
+    console.error(`[${id}] Request failed:`, error.message);
+    sendMessage({ id, ok: false, error: error.message });
+  }
+}
+
+/**
+ * Run as a long-lived worker that reads JSON-lines requests from stdin.
+ * Requests are handled concurrently and each gets its own response line,
+ * tagged with the request id, on stdout. When stdin closes, requests still
+ * in flight are finished and answered before the process exits.
+ */
+function runDaemon() {
+  const input = readline.createInterface({ input: process.stdin });
+  const pending = new Set();
+  
+  input.on('line', (line) => {
+    if (!line.trim()) {
+      return;
+    }
+    let request;
+    try {
+      request = JSON.parse(line);
+    } catch (error) {
+      console.error('Ignoring malformed request:', line);
+      return;
+    }
+    const handled = handleRequest(request);
+    pending.add(handled);
+    handled.finally(() => pending.delete(handled));
+  });
+  
+  // The parent closed our stdin, so nothing else will arrive
+  input.on('close', async () => {
+    await Promise.allSettled([...pending]);
+    process.exit(0);
+  });
+  
+  sendMessage({ type: 'ready', address: account.address });
+}
+
 // Handle command line arguments
 if (require.main === module) {
   const args = process.argv.slice(2);
@@ -318,10 +550,16 @@ if (require.main === module) {
     return; // Don't continue to normal execution
   }
   
+  if (DAEMON_MODE) {
+    runDaemon();
+    return;
+  }
+  
   // Regular execution mode
   if (args.length < 2) {
     console.error('Usage: node storyUploader.js <imagePath> <prompt>');
     console.error('   OR: node storyUploader.js --test (to validate environment)');
+    console.error('   OR: node storyUploader.js --daemon (JSON-lines worker on stdin/stdout)');
     process.exit(1);
   }
   
@@ -338,8 +576,12 @@ if (require.main === module) {
 
 // Export functions for use in other modules
 module.exports = {
+  createLocalNonceManager,
   uploadToIPFS,
   registerOnStoryProtocol,
+  uploadAndRegister,
+  uploadBatch,
   uploadToStoryProtocol,
+  runDaemon,
   validateEnvironment
 }; 
\ No newline at end of file
@@ -0,0 +1,174 @@
+/**
+ * Check uploadBatch from storyUploader.js against stubbed Pinata and Story
+ * Protocol SDKs, so it runs without keys or network access:
+ *
+ *   node upload_batch_test.js
+ *
+ * Exits with status 1 if a batch record is wrong, the concurrency limits
+ * are not respected, a stuck image holds up the batch or the nonce manager
+ * hands out a nonce twice.
+ */
+const assert = require('assert');
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+
+const PIN_CONCURRENCY = 2;
+const REGISTER_CONCURRENCY = 3;
+
+Object.assign(process.env, {
+  WALLET_PRIVATE_KEY: '0x' + '11'.repeat(32),
+  PINATA_JWT: 'test',
+  RPC_PROVIDER_URL: 'http://127.0.0.1:1',
+  PINATA_API: 'test',
+  PINATA_API_SECRET: 'test',
+  STORY_PIN_CONCURRENCY: String(PIN_CONCURRENCY),
+  STORY_REGISTER_CONCURRENCY: String(REGISTER_CONCURRENCY),
+});
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+const peak = { pin: 0, register: 0 };
+const active = { pin: 0, register: 0 };
+
+/**
+ * Run task while counting how many tasks of the same stage are in flight
+ * @param {string} stage - 'pin' or 'register'
+ * @param {Function} task - Async task
+ * @return {Promise<*>} - Result of the task
+ */
+async function track(stage, task) {
+  active[stage] += 1;
+  peak[stage] = Math.max(peak[stage], active[stage]);
+  try {
+    await sleep(20);
+    return await task();
+  } finally {
+    active[stage] -= 1;
+  }
+}
+
+class StubPinata {
+  async pinFileToIPFS(stream) {
+    if (path.basename(stream.path) === 'stuck.png') {
+      stream.destroy();
+      return new Promise(() => {});
+    }
+    return track('pin', async () => {
+      stream.destroy();
+      return { IpfsHash: `Qm${path.basename(stream.path)}` };
+    });
+  }
+}
+
+const StubStoryClient = {
+  newClient() {
+    return {
+      ipAsset: {
+        register: (params) => track('register', async () => ({
+          txHash: `0x${params.metadataURI.slice(-8)}`,
+          ipId: '0xabc',
+        })),
+      },
+    };
+  },
+};
+
+// Replace the SDKs in the require cache before storyUploader.js loads them
+for (const [name, stub] of [
+  ['@pinata/sdk', StubPinata],
+  ['@story-protocol/core-sdk', { StoryClient: StubStoryClient, StoryConfig: {} }],
+]) {
+  const resolved = require.resolve(name);
+  require.cache[resolved] = { id: resolved, filename: resolved, loaded: true, exports: stub };
+}
+
+// The uploader logs every step; keep the output to the test results
+console.log = () => {};
+console.error = () => {};
+const report = process.stdout.write.bind(process.stdout);
+
+const { createLocalNonceManager, uploadBatch } = require('./storyUploader');
+
+/**
+ * Send through a local nonce manager against a fake chain where one send
+ * fails before it is broadcast, leaving a gap. The chain only counts a nonce
+ * once its send lands, so re-syncing while other sends are in flight would
+ * hand out one of their nonces again.
+ */
+async function checkNonceManager() {
+  let pendingCount = 5;
+  const client = { request: async () => pendingCount };
+  const nonceManager = createLocalNonceManager();
+  const used = new Set();
+
+  const send = async (fail) => {
+    await nonceManager.acquire();
+    const nonce = await nonceManager.consume({ address: '0x0', client });
+    await sleep(fail ? 5 : 20);
+    if (fail) {
+      nonceManager.release(true);
+      return;
+    }
+    assert.ok(!used.has(nonce), `nonce ${nonce} handed out twice`);
+    used.add(nonce);
+    pendingCount = Math.max(pendingCount, nonce + 1);
+    nonceManager.release(false);
+  };
+
+  const first = [send(false), send(true), send(false)];
+  await sleep(10);
+  // Started after the failure, so it has to wait for the re-sync
+  await Promise.all([...first, send(false), send(false)]);
+  assert.deepStrictEqual([...used].sort(), [5, 7, 8, 9]);
+}
+
+
+async function main() {
+  const dir = fs.mkdtempSync(path.join(os.tmpdir(), 'upload-batch-test-'));
+  const items = [];
+  for (let i = 0; i < 8; i += 1) {
+    const imagePath = path.join(dir, `image${i}.png`);
+    fs.writeFileSync(imagePath, `image ${i}`);
+    items.push({ imagePath, prompt: `prompt ${i}` });
+  }
+  items.splice(3, 0, { imagePath: path.join(dir, 'missing.png'), prompt: 'missing' });
+
+  try {
+    await checkNonceManager();
+    const records = await uploadBatch(items);
+
+    assert.strictEqual(records.length, items.length);
+    records.forEach((record, i) => {
+      assert.strictEqual(record.imagePath, items[i].imagePath);
+      if (items[i].prompt === 'missing') {
+        assert.strictEqual(record.ok, false);
+        assert.match(record.error, /File not found/);
+      } else {
+        assert.strictEqual(record.ok, true, record.error);
+        assert.strictEqual(record.result.ipfsCid, `Qm${path.basename(items[i].imagePath)}`);
+        assert.strictEqual(record.result.ipId, '0xabc');
+      }
+    });
+    assert.ok(peak.pin <= PIN_CONCURRENCY, `${peak.pin} pins in flight`);
+    assert.ok(peak.register <= REGISTER_CONCURRENCY, `${peak.register} registrations in flight`);
+    assert.ok(peak.pin > 1 && peak.register > 1, 'uploads did not overlap');
+
+    // A stuck image fails on its own once the timeout passes
+    const stuck = { imagePath: path.join(dir, 'stuck.png'), prompt: 'stuck' };
+    fs.writeFileSync(stuck.imagePath, 'stuck');
+    const timed = await uploadBatch([stuck, items[0]], 200);
+    assert.strictEqual(timed[0].ok, false);
+    assert.match(timed[0].error, /Timed out/);
+    assert.strictEqual(timed[1].ok, true, timed[1].error);
+
+    report(`uploadBatch: ${records.filter((record) => record.ok).length}/${records.length} uploaded, `
+      + `peak ${peak.pin} pins and ${peak.register} registrations in flight\n`);
+  } finally {
+    fs.rmSync(dir, { recursive: true, force: true });
+  }
+}
+
+main().catch((error) => {
+  report(`uploadBatch check failed: ${error.stack}\n`);
+  process.exit(1);
+});